@@ -0,0 +1,403 @@
+"""
+Headless HTTP API over the same pipeline the Streamlit app uses.
+
+A plain ASGI app (no web framework), so any ASGI server can host it:
+
+    uvicorn api:app --host 0.0.0.0 --port 8000
+
+The FAISS index, BM25 index, LLM clients and caches are the process-wide
+ones from utils/, so concurrent requests share them. Blocking pipeline work
+runs on a thread pool; the event loop only parses requests and writes responses.
+
+    GET    /health              liveness plus the active index fingerprint
+    GET    /metrics             Prometheus text
+    GET    /documents           files in the upload folder
+    PUT    /documents/{name}    store a file (raw request body) for the next build
+    POST   /index               {"incremental": true} → background indexing job
+    GET    /jobs/{id}           job progress
+    DELETE /jobs/{id}           cancel a job
+    POST   /query               {"question", "session_id"?} → answer + sources
+    POST   /query/stream        same body → server-sent events, one per token
+"""
+import asyncio
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from dotenv import load_dotenv
+
+from utils.bm25 import load_keyword_index
+from utils.index_versions import persist_lock
+from utils.indexer import attach_persisted_index
+from utils.jobs import SUCCEEDED, job_manager
+from utils.model_manager import get_router
+from utils.rag_chain import build_rag_chain
+from utils.resources import get_keyword_index, get_vectorstore
+from utils.tracing import metrics
+
+load_dotenv()
+
+UPLOAD_DIR = "data/uploads"
+VECTOR_DIR = "vectorstore"
+
+
+# --------------------------------------------------
+# ⚙️ CONFIG
+# --------------------------------------------------
+
+# Threads running blocking pipeline calls (retrieval, LLM, token pulls).
+API_MAX_WORKERS = int(os.getenv("API_MAX_WORKERS", "16"))
+
+# Largest request body accepted (uploads included).
+API_MAX_BODY_BYTES = int(os.getenv("API_MAX_BODY_BYTES", str(50 * 1024 * 1024)))
+
+_pool = ThreadPoolExecutor(max_workers=API_MAX_WORKERS, thread_name_prefix="api")
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+async def _blocking(fn, *args):
+    return await asyncio.get_running_loop().run_in_executor(_pool, fn, *args)
+
+
+# --------------------------------------------------
+# 📚 ACTIVE INDEX
+# --------------------------------------------------
+# The API answers from the newest index built in this process, or from the
+# persisted one reattached at startup, exactly like a fresh browser session.
+
+_warm_fingerprint = None
+_warm_lock = threading.Lock()
+_warm_checked = False
+
+
+def warm_start():
+    global _warm_fingerprint, _warm_checked
+
+    with _warm_lock:
+        if _warm_checked:
+            return
+        _warm_checked = True
+
+        try:
+            db, summary = attach_persisted_index(UPLOAD_DIR, VECTOR_DIR)
+        except Exception as e:
+            print(f"⚠️ Warm start failed: {e}")
+            return
+
+        if db is not None:
+            _warm_fingerprint = summary["fingerprint"]
+
+
+def current_fingerprint():
+    built = next((job for job in job_manager.jobs() if job.status == SUCCEEDED), None)
+    if built is not None:
+        return built.summary["fingerprint"]
+    return _warm_fingerprint
+
+
+def make_chain(streaming, session_id=None):
+    fingerprint = current_fingerprint()
+    vectorstore = get_vectorstore(fingerprint) if fingerprint else None
+
+    if vectorstore is None:
+        raise HTTPError(503, "No index loaded. Upload documents and POST /index first.")
+
+    return build_rag_chain(
+        vectorstore,
+        streaming=streaming,
+        fingerprint=fingerprint,
+        keyword_index=get_keyword_index(fingerprint, lambda: load_keyword_index(VECTOR_DIR, vectorstore)),
+        router=get_router().session(session_id),
+    )
+
+
+def serialize_sources(docs):
+    """Unique (source, page) pairs like the chat UI shows, with 1-based pages."""
+    unique = {}
+    for doc in docs:
+        src = doc.metadata.get("source", "Unknown")
+        page = doc.metadata.get("page", "N/A")
+        display_page = int(page) + 1 if str(page).isdigit() else page
+        unique.setdefault(f"{src}-{display_page}", {
+            "source": src,
+            "page": display_page,
+            "content": doc.page_content,
+        })
+    return list(unique.values())
+
+
+# --------------------------------------------------
+# 🔌 ASGI PLUMBING
+# --------------------------------------------------
+
+async def read_body(receive):
+    chunks = []
+    size = 0
+    more = True
+
+    while more:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            raise HTTPError(400, "Client disconnected")
+        chunk = message.get("body", b"")
+        size += len(chunk)
+        if size > API_MAX_BODY_BYTES:
+            raise HTTPError(413, "Request body too large")
+        chunks.append(chunk)
+        more = message.get("more_body", False)
+
+    return b"".join(chunks)
+
+
+async def read_json(receive):
+    body = await read_body(receive)
+    if not body:
+        return {}
+    try:
+        payload = json.loads(body)
+    except ValueError:
+        raise HTTPError(400, "Request body is not valid JSON")
+    if not isinstance(payload, dict):
+        raise HTTPError(400, "Request body must be a JSON object")
+    return payload
+
+
+async def send_response(send, status, body, content_type):
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [
+            (b"content-type", content_type.encode()),
+            (b"content-length", str(len(body)).encode()),
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+async def send_json(send, status, payload):
+    body = json.dumps(payload, default=str).encode("utf-8")
+    await send_response(send, status, body, "application/json")
+
+
+def sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n".encode("utf-8")
+
+
+# --------------------------------------------------
+# 🛣️ HANDLERS
+# --------------------------------------------------
+
+async def health(scope, receive, send):
+    active = job_manager.active()
+    await send_json(send, 200, {
+        "status": "ok",
+        "index_fingerprint": current_fingerprint(),
+        "active_job": active.id if active else None,
+    })
+
+
+async def prometheus(scope, receive, send):
+    body = metrics.prometheus_text().encode("utf-8")
+    await send_response(send, 200, body, "text/plain; version=0.0.4")
+
+
+async def list_documents(scope, receive, send):
+    names = sorted(os.listdir(UPLOAD_DIR)) if os.path.isdir(UPLOAD_DIR) else []
+    await send_json(send, 200, {"documents": names})
+
+
+async def put_document(scope, receive, send, name):
+    filename = os.path.basename(name)
+    if not filename or filename in (".", ".."):
+        raise HTTPError(400, "Invalid document name")
+
+    body = await read_body(receive)
+
+    # A running job is hashing and reading this folder; its manifest must match what it indexed.
+    if job_manager.active() is not None:
+        raise HTTPError(409, "An indexing job is running; upload after it finishes")
+
+    def write():
+        # The UI process may be indexing the same folder.
+        with persist_lock(VECTOR_DIR, timeout=0):
+            os.makedirs(UPLOAD_DIR, exist_ok=True)
+            with open(os.path.join(UPLOAD_DIR, filename), "wb") as f:
+                f.write(body)
+
+    try:
+        await _blocking(write)
+    except TimeoutError:
+        raise HTTPError(409, "An indexing job is running in another process; upload after it finishes")
+    await send_json(send, 201, {"document": filename, "bytes": len(body)})
+
+
+async def start_index(scope, receive, send):
+    payload = await read_json(receive)
+
+    if job_manager.active() is not None:
+        raise HTTPError(409, "An indexing job is already running")
+    if not (os.path.isdir(UPLOAD_DIR) and os.listdir(UPLOAD_DIR)):
+        raise HTTPError(400, "No documents uploaded")
+
+    job = job_manager.submit(UPLOAD_DIR, VECTOR_DIR, incremental=bool(payload.get("incremental", True)))
+    await send_json(send, 202, job.to_dict())
+
+
+async def get_job(scope, receive, send, job_id):
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPError(404, "Unknown job")
+    await send_json(send, 200, job.to_dict())
+
+
+async def cancel_job(scope, receive, send, job_id):
+    if job_manager.get(job_id) is None:
+        raise HTTPError(404, "Unknown job")
+    if not job_manager.cancel(job_id):
+        raise HTTPError(409, "Job already finished")
+    await send_json(send, 202, job_manager.get(job_id).to_dict())
+
+
+async def _question(receive):
+    payload = await read_json(receive)
+    question = payload.get("question")
+    if not isinstance(question, str) or not question.strip():
+        raise HTTPError(400, "'question' is required")
+    return question, payload.get("session_id")
+
+
+async def query(scope, receive, send):
+    question, session_id = await _question(receive)
+    # Building a chain opens SQLite files and may load a rerank model: keep it off the event loop.
+    ask = await _blocking(make_chain, False, session_id)
+
+    answer, docs = await _blocking(ask, question)
+    await send_json(send, 200, {"answer": answer, "sources": serialize_sources(docs)})
+
+
+async def query_stream(scope, receive, send):
+    question, session_id = await _question(receive)
+    ask_stream = await _blocking(make_chain, True, session_id)
+
+    # Retrieval and provider failover happen here, up to the first token.
+    tokens, docs = await _blocking(ask_stream, question)
+
+    disconnected = asyncio.Event()
+
+    async def watch_disconnect():
+        while (await receive())["type"] != "http.disconnect":
+            pass
+        disconnected.set()
+
+    watcher = asyncio.ensure_future(watch_disconnect())
+
+    await send({
+        "type": "http.response.start",
+        "status": 200,
+        "headers": [
+            (b"content-type", b"text/event-stream"),
+            (b"cache-control", b"no-cache"),
+        ],
+    })
+
+    try:
+        while not disconnected.is_set():
+            token = await _blocking(next, tokens, None)
+            if token is None:
+                break
+            await send({"type": "http.response.body", "body": sse("token", token), "more_body": True})
+
+        if not disconnected.is_set():
+            await send({"type": "http.response.body", "body": sse("sources", serialize_sources(docs)), "more_body": True})
+            await send({"type": "http.response.body", "body": sse("done", {}), "more_body": False})
+    except Exception as e:
+        # Headers are already sent, so the error goes out as a final event.
+        print(f"⚠️ Streaming answer failed: {e}")
+        await send({"type": "http.response.body", "body": sse("error", {"error": str(e)}), "more_body": False})
+    finally:
+        watcher.cancel()
+        # Stops the provider stream if the client went away mid-answer.
+        close = getattr(tokens, "close", None)
+        if close is not None:
+            await _blocking(close)
+
+
+ROUTES = {
+    ("GET", "/health"): health,
+    ("GET", "/metrics"): prometheus,
+    ("GET", "/documents"): list_documents,
+    ("POST", "/index"): start_index,
+    ("POST", "/query"): query,
+    ("POST", "/query/stream"): query_stream,
+}
+
+# Routes with one trailing path parameter.
+PREFIX_ROUTES = {
+    ("PUT", "/documents/"): put_document,
+    ("GET", "/jobs/"): get_job,
+    ("DELETE", "/jobs/"): cancel_job,
+}
+
+
+def resolve(method, path):
+    handler = ROUTES.get((method, path))
+    if handler is not None:
+        return handler, ()
+
+    known_path = any(route_path == path for _, route_path in ROUTES)
+
+    for (route_method, prefix), handler in PREFIX_ROUTES.items():
+        param = path[len(prefix):]
+        if not path.startswith(prefix) or not param or "/" in param:
+            continue
+        if route_method == method:
+            return handler, (param,)
+        known_path = True
+
+    if known_path:
+        raise HTTPError(405, "Method not allowed")
+    raise HTTPError(404, "Not found")
+
+
+# --------------------------------------------------
+# 🚀 APP
+# --------------------------------------------------
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            await _blocking(warm_start)
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        await lifespan(receive, send)
+        return
+
+    if scope["type"] != "http":
+        return
+
+    # Servers without lifespan support still get the persisted index.
+    if not _warm_checked:
+        await _blocking(warm_start)
+
+    try:
+        handler, params = resolve(scope["method"], scope["path"].rstrip("/") or "/")
+        await handler(scope, receive, send, *params)
+    except HTTPError as e:
+        await send_json(send, e.status, {"error": e.message})
+    except Exception as e:
+        print(f"⚠️ API request failed: {e}")
+        await send_json(send, 500, {"error": str(e)})
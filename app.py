@@ -4,19 +4,22 @@
 import streamlit as st
 import os
 import json
-import shutil
-import time
-import re
 import html
+import uuid
 from datetime import datetime
 from dotenv import load_dotenv
 
 # Local utility imports
-from utils.loader import load_documents
-from utils.splitter import split_documents
-from utils.embeddings import create_vectorstore
+from utils.indexer import attach_persisted_index
+from utils.index_versions import persist_lock
+from utils.jobs import CANCELLED, SUCCEEDED, job_manager
+from utils.model_manager import get_router
 from utils.rag_chain import build_rag_chain
+from utils.bm25 import load_keyword_index
+from utils.resources import get_keyword_index, get_vectorstore, latest_fingerprint
 from utils.reset import reset_app
+from utils.dashboard import cache_hit_rates, latency_histogram, performance_snapshot, provider_rows, stage_latencies
+from utils.tracing import start_metrics_server
 
 # ==============================================================================
 # APP CONFIGURATION
@@ -24,6 +27,9 @@ from utils.reset import reset_app
 # Load environment variables from a .env file for security
 load_dotenv()
 
+# Optional Prometheus scrape endpoint (METRICS_PORT); started once per process.
+start_metrics_server()
+
 # Configure the Streamlit page
 st.set_page_config(
     page_title="AI Document Search Pro",
@@ -626,8 +632,31 @@ if "docs_processed" not in st.session_state:
 if "generating" not in st.session_state:
     st.session_state.generating = False
 
-if "vectorstore" not in st.session_state:
-    st.session_state.vectorstore = None
+# Keys this session's provider-routing view, so one user's failover doesn't move others.
+if "session_id" not in st.session_state:
+    st.session_state.session_id = uuid.uuid4().hex
+
+# The index itself is shared process-wide (utils/resources.py); a session only
+# keeps the fingerprint of the corpus it is chatting with.
+if "index_fingerprint" not in st.session_state:
+    st.session_state.index_fingerprint = None
+
+# Warm start: reattach the index persisted by an earlier process or session
+# (validated against its manifest) instead of forcing a re-upload.
+if "warm_start_checked" not in st.session_state:
+    st.session_state.warm_start_checked = True
+    try:
+        warm_db, warm_summary = attach_persisted_index(UPLOAD_DIR, VECTOR_DIR)
+    except Exception as e:
+        print(f"⚠️ Warm start failed: {e}")
+        warm_db, warm_summary = None, None
+
+    if warm_db is not None:
+        st.session_state.index_fingerprint = warm_summary["fingerprint"]
+        st.session_state.docs_processed = True
+        st.session_state.stats["files"] = warm_summary["files"]
+        st.session_state.stats["pages"] = warm_summary["pages"]
+        st.session_state.stats["chunks"] = warm_summary["chunks"]
 
 
 # ==============================================================================
@@ -685,8 +714,9 @@ st.sidebar.markdown("""
 """, unsafe_allow_html=True)
 
 if st.sidebar.button("🗑️ Clear & Reset App", use_container_width=True):
-    reset_app()
-    st.rerun()
+    if reset_app():
+        st.rerun()
+    st.sidebar.warning("An indexing job is still running. Try resetting again in a moment.")
 
 # File Uploader
 st.sidebar.markdown('<div style="font-size: 0.8rem; color: var(--text-secondary); margin: 1rem 0 0.5rem 0;">Upload PDF or TXT files</div>', unsafe_allow_html=True)
@@ -698,64 +728,107 @@ uploaded_files = st.sidebar.file_uploader(
 )
 
 # Document Processing Logic
+incremental = st.sidebar.toggle(
+    "♻️ Incremental indexing",
+    value=True,
+    help="Only embed added or changed files and drop removed ones instead of rebuilding the whole index.",
+)
+
 if st.sidebar.button("🚀 Process Documents", use_container_width=True):
-    if uploaded_files:
-        # Start a clean session whenever user processes a new upload batch.
-        st.session_state.docs_processed = False
-        st.session_state.messages = []
-        st.session_state.vectorstore = None
+    if job_manager.active() is not None:
+        st.sidebar.warning("An indexing job is already running. Cancel it or wait for it to finish.")
+    elif uploaded_files:
+        try:
+            # The API process may be indexing the same folder.
+            with persist_lock(VECTOR_DIR, timeout=0):
+                # Only the current selection is indexed: drop files that were not re-uploaded.
+                os.makedirs(UPLOAD_DIR, exist_ok=True)
+                selected = {file.name for file in uploaded_files}
+                for filename in os.listdir(UPLOAD_DIR):
+                    if filename not in selected:
+                        os.remove(os.path.join(UPLOAD_DIR, filename))
+
+                # Save uploaded files to the upload directory
+                for file in uploaded_files:
+                    with open(os.path.join(UPLOAD_DIR, file.name), "wb") as f:
+                        f.write(file.getbuffer())
+        except TimeoutError:
+            st.sidebar.warning("Another process is indexing these documents. Try again when it finishes.")
+        else:
+            # RAG Pipeline Steps: Load -> Split -> Embed -> Store, in the background.
+            # The current index keeps answering questions until the new one is swapped in.
+            job = job_manager.submit(UPLOAD_DIR, VECTOR_DIR, incremental=incremental)
+            st.session_state.index_job_id = job.id
+    else:
+        st.sidebar.error("Please upload files first")
 
-        st.sidebar.info("Previous document context cleared. Processing new document...")
+# A refreshed browser tab has lost its job id; pick up whatever job is still running.
+if st.session_state.get("index_job_id") is None and job_manager.active() is not None:
+    st.session_state.index_job_id = job_manager.active().id
 
-        # Always wipe previous uploads so only the current selection is indexed.
-        if os.path.exists(UPLOAD_DIR):
-            shutil.rmtree(UPLOAD_DIR)
 
-        # Save uploaded files to the upload directory
-        os.makedirs(UPLOAD_DIR, exist_ok=True)
-        for file in uploaded_files:
-            with open(os.path.join(UPLOAD_DIR, file.name), "wb") as f:
-                f.write(file.getbuffer())
+def apply_finished_job(job):
+    """Swap this session onto a finished job's index (or report why not)."""
+    st.session_state.index_job_id = None
 
-        st.session_state.stats["files"] = len(uploaded_files)
+    if job.status == SUCCEEDED:
+        summary = job.summary
 
-        # RAG Pipeline Steps: Load -> Split -> Embed -> Store
-        with st.spinner("📄 Loading..."):
-            docs = load_documents(UPLOAD_DIR)
-        st.session_state.stats["pages"] = len(docs)
+        # Start a clean conversation on the new document set.
+        st.session_state.messages = []
+        st.session_state.stats["files"] = summary["files"]
+        st.session_state.stats["pages"] = summary["pages"]
+        st.session_state.stats["chunks"] = summary["chunks"]
+        st.session_state.index_fingerprint = summary["fingerprint"]
+        st.session_state.docs_processed = True
+        st.session_state.index_notice = (
+            "success",
+            f"✨ Vector store ready! +{len(summary['added'])} added, "
+            f"{len(summary['changed'])} changed, {len(summary['removed'])} removed",
+        )
+    elif job.status == CANCELLED:
+        st.session_state.index_notice = ("info", "Indexing cancelled. The previous documents are still loaded.")
+    else:
+        st.session_state.index_notice = ("error", f"Failed to create vector store: {job.error}")
 
-        with st.spinner("✂️ Splitting..."):
-            chunks = split_documents(docs)
-        st.session_state.stats["chunks"] = len(chunks)
 
-        if not docs:
-            st.sidebar.error("No documents were loaded. Please upload valid PDF or TXT files.")
-        elif not chunks:
-            st.sidebar.error("No readable text was found to index. Try text-based files (not image-only PDFs).")
-        else:
-            # Always rebuild a fresh FAISS index for the current upload batch.
-            if os.path.exists(VECTOR_DIR):
-                shutil.rmtree(VECTOR_DIR)
-
-            try:
-                with st.spinner("🧠 Creating embeddings..."):
-                    db = create_vectorstore(chunks, VECTOR_DIR)
-
-                if db is None:
-                    st.sidebar.error("Embedding creation failed. Please try again.")
-                    st.stop()
-
-                st.session_state["vectorstore"] = db
-                st.session_state.docs_processed = True
-                st.sidebar.success("✨ Fresh vector store created!")
-            except ValueError as e:
-                st.sidebar.error(str(e))
-                st.stop()
-            except Exception as e:
-                st.sidebar.error(f"Failed to create vector store: {e}")
-                st.stop()
+@st.fragment(run_every=1.0)
+def index_job_status():
+    """Polls the background job; a full rerun happens only when it finishes."""
+    job_id = st.session_state.get("index_job_id")
+    job = job_manager.get(job_id) if job_id else None
+
+    if job is None:
+        return
+
+    if job.finished:
+        apply_finished_job(job)
+        st.rerun(scope="app")
+
+    if job.files_total:
+        text = f"📄 {job.files_done}/{job.files_total} files · 🧠 {job.chunks_indexed} chunks embedded"
     else:
-        st.sidebar.error("Please upload files first")
+        text = "📚 Indexing documents..."
+
+    eta = job.eta_seconds()
+    if eta is not None:
+        text += f" · ⏳ ~{eta:.0f}s left"
+
+    st.progress(job.progress(), text=text)
+
+    if job.cancel_requested:
+        st.caption("Cancelling...")
+    elif st.button("🛑 Cancel indexing", use_container_width=True, key=f"cancel_{job.id}"):
+        job_manager.cancel(job.id)
+
+
+with st.sidebar:
+    index_job_status()
+
+notice = st.session_state.pop("index_notice", None)
+if notice:
+    level, message = notice
+    getattr(st.sidebar, level)(message)
 
 st.sidebar.markdown("<div style='height: 1.5rem;'></div>", unsafe_allow_html=True)
 
@@ -803,13 +876,37 @@ tab_chat, tab_analytics = st.tabs(["💬 Chat", "📊 Analytics"])
 # --- Chat Tab ---
 # This tab contains the main chat interface and logic for handling user queries.
 with tab_chat:
-    # Use the in-session vectorstore to avoid stale disk context reuse.
-    vectorstore = st.session_state.get("vectorstore")
+    # Look up the shared index for this session's corpus. When another session
+    # re-indexed, the previous version keeps serving this chat until it goes
+    # idle; once it is dropped, follow the replacement instead of going blank.
+    vectorstore = get_vectorstore(st.session_state.index_fingerprint)
+    newer_fingerprint = latest_fingerprint(st.session_state.index_fingerprint)
+
+    if newer_fingerprint != st.session_state.index_fingerprint:
+        if vectorstore is None and get_vectorstore(newer_fingerprint) is not None:
+            st.session_state.index_fingerprint = newer_fingerprint
+            vectorstore = get_vectorstore(newer_fingerprint)
+            st.info("📚 The documents were re-indexed in another session; this chat now uses the new index.")
+        elif vectorstore is not None:
+            st.info("📚 The documents were re-indexed in another session. This chat still answers from the previous version.")
+            if st.button("🔄 Switch to the new index", key="switch_index"):
+                st.session_state.index_fingerprint = newer_fingerprint
+                st.session_state.messages = []
+                st.rerun()
             
     # Display chat interface only if documents have been processed
     if vectorstore and st.session_state.docs_processed:
         # --- Chat History Display ---
-        rag_chain = build_rag_chain(vectorstore)
+        rag_chain = build_rag_chain(
+            vectorstore,
+            streaming=True,
+            fingerprint=st.session_state.index_fingerprint,
+            keyword_index=get_keyword_index(
+                st.session_state.index_fingerprint,
+                lambda: load_keyword_index(VECTOR_DIR, vectorstore),
+            ),
+            router=get_router().session(st.session_state.session_id),
+        )
         if st.session_state.messages:
             for msg in st.session_state.messages:
                 with st.chat_message(msg["role"], avatar="👤" if msg["role"] == "user" else "🤖"):
@@ -849,19 +946,18 @@ with tab_chat:
                     st.session_state.messages.append({"role": "assistant", "content": "", "sources": []})
                     try:
                         with st.spinner("Generating response..."):
-                            answer, sources = rag_chain(question_to_process)
+                            tokens, sources = rag_chain(question_to_process)
                     except Exception as e:
                         st.error(f"⚠️ {e}")
                         st.session_state.messages.pop()
                         st.session_state.generating = False
                         st.rerun()
 
+                    # Relay provider tokens as they arrive.
                     def stream_text():
-                        tokens = re.split(r'(\s+)', answer)
                         for token in tokens:
                             st.session_state.messages[-1]["content"] += token
                             yield token
-                            time.sleep(0.01)
                     
                     st.write_stream(stream_text)
 
@@ -953,6 +1049,67 @@ with tab_analytics:
     if any(v > 0 for v in stats_data.values()):
         st.bar_chart(stats_data)
 
+    # --- Live performance (process-wide, all sessions) ---
+    st.markdown("""
+    <div style="margin: 1.25rem 0 0.75rem 0;">
+        <h3 style="font-size: 1rem; font-weight: 700; color: var(--text-primary); margin-bottom: 0.25rem;">⚡ Performance</h3>
+        <p style="font-size: 0.75rem; color: var(--text-secondary); margin: 0;">Recent activity across all sessions in this process</p>
+    </div>
+    """, unsafe_allow_html=True)
+
+    perf = performance_snapshot(get_vectorstore(st.session_state.index_fingerprint))
+
+    def fmt_ms(value):
+        return "—" if value is None else f"{value:,.0f} ms"
+
+    memory = perf["index_memory_bytes"]
+    perf_cards = {
+        "Answer p95": fmt_ms(perf["answer"]["p95_ms"]),
+        "First token p50": fmt_ms(perf["ttft"]["p50_ms"]),
+        "Build chunks/s": "—" if perf["build_chunks_per_s"] is None else f"{perf['build_chunks_per_s']:,.0f}",
+        "Index memory": "—" if memory is None else f"{memory / 1024 / 1024:,.1f} MB",
+        "Failovers": perf["failovers"],
+    }
+    perf_icons = ["⏱️", "⚡", "🧠", "💾", "🔁"]
+
+    for col, icon, (label, value) in zip(st.columns(len(perf_cards)), perf_icons, perf_cards.items()):
+        with col:
+            st.markdown(f"""
+            <div class="analytics-card">
+                <div class="analytics-icon">{icon}</div>
+                <div class="analytics-value">{value}</div>
+                <div class="analytics-label">{label}</div>
+            </div>
+            """, unsafe_allow_html=True)
+
+    st.markdown("<div style='height: 0.75rem;'></div>", unsafe_allow_html=True)
+
+    hit_rates = cache_hit_rates()
+    if hit_rates:
+        st.caption("Cache hit rates")
+        for col, (cache, rate) in zip(st.columns(len(hit_rates)), hit_rates.items()):
+            with col:
+                st.metric(
+                    f"{cache.replace('_', ' ').title()} cache",
+                    "—" if rate["hit_rate"] is None else f"{rate['hit_rate']:.0%}",
+                    help=f"{rate['hits']} hits / {rate['misses']} misses",
+                )
+
+    stages = stage_latencies()
+    if stages:
+        st.caption("Stage latency (recent window)")
+        st.dataframe(stages, hide_index=True, use_container_width=True)
+
+        stage = st.selectbox("Latency histogram", [row["stage"] for row in stages])
+        st.bar_chart(latency_histogram(stage))
+    else:
+        st.info("No timings yet. Process documents or ask a question to populate the dashboard.")
+
+    providers = provider_rows()
+    if providers:
+        st.caption("Providers")
+        st.dataframe(providers, hide_index=True, use_container_width=True)
+
 # ==============================================================================
 # FOOTER
 # ==============================================================================
@@ -0,0 +1,74 @@
+import os
+import random
+
+# Roughly one printed page of prose.
+WORDS_PER_PAGE = 350
+
+_TOPICS = [
+    "cricket", "batting", "bowling", "wicket", "stadium", "tournament",
+    "contract", "liability", "warranty", "invoice", "delivery", "payment",
+    "engine", "turbine", "pressure", "sensor", "calibration", "firmware",
+    "patient", "dosage", "symptom", "diagnosis", "therapy", "clinic",
+]
+
+_FILLER = (
+    "the of and to in is that for with as on by this be are from at or "
+    "which an it was were will can has have not their its also more than"
+).split()
+
+
+def _word(rng):
+    if rng.random() < 0.25:
+        return rng.choice(_TOPICS)
+    if rng.random() < 0.5:
+        return rng.choice(_FILLER)
+    return "".join(rng.choice("abcdefghijklmnoprstuvwy") for _ in range(rng.randint(3, 9)))
+
+
+def make_page(rng, page_number):
+    words = [_word(rng) for _ in range(WORDS_PER_PAGE)]
+
+    # Identifier-style tokens give the BM25 lexical shortcut something to find.
+    words.insert(rng.randrange(len(words)), f"clause {page_number // 10}.{page_number % 10}.{rng.randint(1, 9)}")
+    words.insert(rng.randrange(len(words)), f"part-{page_number:06d}")
+
+    return " ".join(words) + "."
+
+
+def write_corpus(folder, pages, pages_per_file=100, seed=0):
+    """
+    Write `pages` synthetic pages as .txt files of up to `pages_per_file`
+    pages each (pages separated by blank lines). Returns the file paths.
+    """
+    os.makedirs(folder, exist_ok=True)
+    rng = random.Random(seed)
+    paths = []
+
+    for start in range(0, pages, pages_per_file):
+        stop = min(pages, start + pages_per_file)
+        path = os.path.join(folder, f"synthetic_{start:06d}.txt")
+
+        with open(path, "w", encoding="utf-8") as f:
+            for page_number in range(start, stop):
+                f.write(make_page(rng, page_number))
+                f.write("\n\n")
+
+        paths.append(path)
+
+    return paths
+
+
+def make_questions(n, pages, seed=1):
+    """Mixed workload: topical questions plus exact identifier lookups."""
+    rng = random.Random(seed)
+    questions = []
+
+    for i in range(n):
+        page = rng.randrange(max(1, pages))
+        if i % 4 == 3:
+            questions.append(f"What does part-{page:06d} refer to?")
+        else:
+            topics = rng.sample(_TOPICS, 3)
+            questions.append(f"What is said about {topics[0]} and {topics[1]} in relation to {topics[2]} ({i})?")
+
+    return questions
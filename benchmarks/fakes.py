@@ -0,0 +1,130 @@
+import hashlib
+import random
+import threading
+import time
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from pydantic import PrivateAttr
+
+
+# --------------------------------------------------
+# 🎲 LATENCY / ERROR INJECTION
+# --------------------------------------------------
+
+class Injector:
+    """Seeded, thread-safe source of simulated latency and failures."""
+
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0, seed=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def delay(self, base=None):
+        base = self.latency if base is None else base
+        with self._lock:
+            # Log-normal jitter gives the long right tail real providers show.
+            factor = self._rng.lognormvariate(0, self.jitter) if self.jitter else 1.0
+        if base > 0:
+            time.sleep(base * factor)
+
+    def maybe_fail(self, what):
+        with self._lock:
+            failed = self._rng.random() < self.error_rate
+        if failed:
+            raise RuntimeError(f"429 RESOURCE_EXHAUSTED: injected {what} failure")
+
+
+# --------------------------------------------------
+# 🧠 FAKE EMBEDDINGS
+# --------------------------------------------------
+
+class FakeEmbeddings(Embeddings):
+    """
+    Deterministic stand-in for GoogleGenerativeAIEmbeddings.
+
+    Vectors are a bag of hashed tokens projected to `dim` and normalised, so
+    texts sharing words land close together and retrieval is meaningful.
+    Each call sleeps `latency` plus `per_text_latency` per text.
+    """
+
+    def __init__(self, dim=768, latency=0.05, per_text_latency=0.0005, jitter=0.3, error_rate=0.0, seed=0):
+        self.dim = dim
+        self.per_text_latency = per_text_latency
+        self.injector = Injector(latency, jitter, error_rate, seed)
+        self.calls = 0
+        self.texts = 0
+
+    def _vector(self, text):
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for token in text.lower().split():
+            digest = hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest()
+            value = int.from_bytes(digest, "little")
+            vector[value % self.dim] += 1.0 if value & (1 << 63) else -1.0
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def _call(self, texts):
+        self.calls += 1
+        self.texts += len(texts)
+        self.injector.delay(self.injector.latency + self.per_text_latency * len(texts))
+        self.injector.maybe_fail("embedding")
+        return [self._vector(text) for text in texts]
+
+    def embed_documents(self, texts, **kwargs):
+        return self._call(texts)
+
+    def embed_query(self, text, **kwargs):
+        return self._call([text])[0]
+
+
+# --------------------------------------------------
+# 🤖 FAKE CHAT MODEL
+# --------------------------------------------------
+
+class FakeChatModel(BaseChatModel):
+    """
+    Local chat model that "answers" by echoing words from the prompt, with
+    configurable time-to-first-token, per-token latency and failure rate.
+    Streams real chunks, so failover and hedging paths are exercised.
+    """
+
+    first_token_latency: float = 0.3
+    token_latency: float = 0.002
+    jitter: float = 0.3
+    error_rate: float = 0.0
+    answer_tokens: int = 60
+    seed: int = 0
+
+    _injector: Injector = PrivateAttr(default=None)
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._injector = Injector(self.first_token_latency, self.jitter, self.error_rate, self.seed)
+
+    @property
+    def _llm_type(self):
+        return "fake-benchmark-chat"
+
+    def _tokens(self, messages):
+        words = " ".join(str(message.content) for message in messages).split()
+        self._injector.delay()
+        self._injector.maybe_fail("chat")
+
+        for i in range(self.answer_tokens):
+            if i:
+                self._injector.delay(self.token_latency)
+            yield (words[i % len(words)] if words else "ok") + " "
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        text = "".join(self._tokens(messages))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text))])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        for token in self._tokens(messages):
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token))
@@ -0,0 +1,312 @@
+"""
+Offline benchmark of the full RAG pipeline against local stand-in providers.
+
+Runs the streaming index build, then load, split and embed as separate
+stages, then retrieval and end-to-end ask() over synthetic corpora, with
+deterministic fake embeddings and chat models whose latency and error rates
+are configurable. No API keys or network needed.
+
+    python -m benchmarks.run_pipeline --pages 10,1000,10000,100000 --output benchmark.json
+
+Each corpus size runs in its own process. The index build runs first and
+reports its own peak RSS; the top-level peak covers the whole run.
+"""
+import argparse
+import json
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+
+# --------------------------------------------------
+# 📊 STATS
+# --------------------------------------------------
+
+def summarize_latencies(seconds):
+    """p50/p95/p99/mean in milliseconds over a list of durations in seconds."""
+    if not seconds:
+        return {"n": 0}
+
+    ordered = sorted(seconds)
+
+    def pct(p):
+        return round(ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))] * 1000, 2)
+
+    return {
+        "n": len(ordered),
+        "p50_ms": pct(50),
+        "p95_ms": pct(95),
+        "p99_ms": pct(99),
+        "mean_ms": round(sum(ordered) / len(ordered) * 1000, 2),
+    }
+
+
+def peak_rss_mb():
+    # ru_maxrss is KiB on Linux; children covers the document-loading process pool.
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return {"self": round(own / 1024, 1), "children": round(children / 1024, 1)}
+
+
+class Timer:
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.seconds = time.perf_counter() - self.started
+
+
+# --------------------------------------------------
+# 🧪 ONE CORPUS SIZE
+# --------------------------------------------------
+
+def _isolate(workdir, args):
+    """Point every cache at the scratch dir and lift real-provider rate limits. Must run before importing utils."""
+    os.environ.update({
+        "EMBEDDING_CACHE_PATH": os.path.join(workdir, "embedding_cache.sqlite3"),
+        "ANSWER_CACHE_PATH": os.path.join(workdir, "answer_cache.sqlite3"),
+        "EMBED_REQUESTS_PER_MINUTE": "1000000",
+        # A second provider so failover (and hedging) have somewhere to go.
+        "OPENROUTER_API_KEY": "benchmark",
+        "OPENROUTER_MODEL": "benchmark-fallback",
+        "OPENROUTER_FALLBACK_MODELS": "",
+        "HEDGE_REQUESTS": "true" if args.hedge else "false",
+        "MULTI_QUERY": "true" if args.multi_query else "false",
+        "RERANK": args.rerank,
+    })
+
+
+def _timed_calls(fn, items):
+    durations = []
+    for item in items:
+        with Timer() as t:
+            fn(item)
+        durations.append(t.seconds)
+    return durations
+
+
+def run_size(pages, args):
+    workdir = tempfile.mkdtemp(prefix=f"rag-bench-{pages}-")
+    _isolate(workdir, args)
+
+    from benchmarks.corpus import make_questions, write_corpus
+    from benchmarks.fakes import FakeChatModel, FakeEmbeddings
+    from utils.bm25 import load_keyword_index
+    from utils.embedding_cache import EmbeddingCache
+    from utils.embeddings import embed_texts, set_embeddings_factory
+    from utils.indexer import INDEX_BATCH_SIZE, index_folder
+    from utils.loader import iter_file_documents
+    from utils.model_manager import set_llm_factory
+    from utils.rag_chain import build_rag_chain
+    from utils.retrievers import build_retriever
+    from utils.splitter import iter_split_documents
+
+    embeddings = FakeEmbeddings(
+        dim=args.dim,
+        latency=args.embed_latency,
+        error_rate=args.embed_error_rate,
+        seed=args.seed,
+    )
+    set_embeddings_factory(lambda model_name: embeddings)
+
+    def make_llm(provider, model):
+        primary = provider == "gemini"
+        return FakeChatModel(
+            first_token_latency=args.llm_latency if primary else args.fallback_latency,
+            error_rate=args.llm_error_rate if primary else 0.0,
+            seed=args.seed + (0 if primary else 1),
+        )
+
+    set_llm_factory(make_llm)
+
+    folder = os.path.join(workdir, "docs")
+    persist_dir = os.path.join(workdir, "index")
+    files = write_corpus(folder, pages, seed=args.seed)
+
+    stages = {}
+
+    # Full build path as the app runs it: load + split + embed + FAISS + BM25 + persist.
+    # It runs first so its peak RSS is not hidden behind the stage passes below.
+    with Timer() as t:
+        db, summary = index_folder(folder, persist_dir, incremental=False)
+    stages["index_build"] = {
+        "seconds": round(t.seconds, 3),
+        "chunks_per_s": round(summary["chunks"] / t.seconds, 1),
+        "embedding_calls": embeddings.calls,
+        "index_report": summary.get("index_report"),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+    # Stage passes drain the same streaming iterators the indexer uses and
+    # keep nothing, so they measure throughput, not the harness holding the corpus.
+    with Timer() as t:
+        for _ in iter_file_documents(files):
+            pass
+    # A .txt file loads as one Document however many pages it holds, so
+    # throughput is reported against the pages written to the corpus.
+    stages["load"] = {
+        "seconds": round(t.seconds, 3),
+        "pages_per_s": round(pages / t.seconds, 1),
+        "files_per_s": round(len(files) / t.seconds, 1),
+    }
+
+    # Split and embed are timed inside one streaming pass; loading is excluded.
+    # Embedding goes through a scratch cache so every chunk reaches the provider.
+    scratch_cache = EmbeddingCache(os.path.join(workdir, "embed_stage_cache.sqlite3"))
+    calls_before = embeddings.calls
+    chunks = 0
+    split_seconds = 0.0
+    embed_seconds = 0.0
+    batch = []
+
+    def embed_batch():
+        nonlocal embed_seconds
+        with Timer() as t:
+            embed_texts(batch, embeddings, cache=scratch_cache)
+        embed_seconds += t.seconds
+        batch.clear()
+
+    for _, docs in iter_file_documents(files):
+        with Timer() as t:
+            texts = [chunk.page_content for chunk in iter_split_documents(docs)]
+        split_seconds += t.seconds
+        chunks += len(texts)
+
+        for text in texts:
+            batch.append(text)
+            if len(batch) >= INDEX_BATCH_SIZE:
+                embed_batch()
+    if batch:
+        embed_batch()
+
+    stages["split"] = {"seconds": round(split_seconds, 3), "chunks_per_s": round(chunks / split_seconds, 1)}
+    stages["embed"] = {
+        "seconds": round(embed_seconds, 3),
+        "chunks_per_s": round(chunks / embed_seconds, 1),
+        "embedding_calls": embeddings.calls - calls_before,
+    }
+
+    keyword_index = load_keyword_index(persist_dir, db)
+
+    retriever = build_retriever(db, keyword_index, k=4)
+    questions = make_questions(args.questions, pages, seed=args.seed + 10)
+    stages["retrieval"] = summarize_latencies(_timed_calls(retriever.invoke, questions))
+
+    failures = []
+
+    def ask_once(question):
+        answer, _ = ask(question)
+        if answer.startswith("⚠️"):
+            failures.append(question)
+
+    ask = build_rag_chain(db, keyword_index=keyword_index)
+    questions = make_questions(args.questions, pages, seed=args.seed + 20)
+    stages["ask"] = summarize_latencies(_timed_calls(ask_once, questions))
+    stages["ask"]["failed"] = len(failures)
+
+    ask_stream = build_rag_chain(db, streaming=True, keyword_index=keyword_index)
+    ttft = []
+    for question in make_questions(args.questions, pages, seed=args.seed + 30):
+        with Timer() as t:
+            tokens, _ = ask_stream(question)
+            next(tokens, "")
+        ttft.append(t.seconds)
+        for _ in tokens:
+            pass
+    stages["time_to_first_token"] = summarize_latencies(ttft)
+
+    result = {
+        "pages": pages,
+        "files": len(files),
+        "chunks": chunks,
+        "stages": stages,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+    shutil.rmtree(workdir, ignore_errors=True)
+    return result
+
+
+# --------------------------------------------------
+# 🚀 CLI
+# --------------------------------------------------
+
+def _parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", default="10,1000,10000", help="comma-separated corpus sizes in pages")
+    parser.add_argument("--questions", type=int, default=50)
+    parser.add_argument("--dim", type=int, default=768, help="fake embedding width")
+    parser.add_argument("--embed-latency", type=float, default=0.05, help="seconds per embedding request")
+    parser.add_argument("--embed-error-rate", type=float, default=0.0)
+    parser.add_argument("--llm-latency", type=float, default=0.3, help="primary time to first token (s)")
+    parser.add_argument("--llm-error-rate", type=float, default=0.0, help="primary provider failure rate")
+    parser.add_argument("--fallback-latency", type=float, default=0.5, help="fallback time to first token (s)")
+    parser.add_argument("--hedge", action="store_true")
+    parser.add_argument("--multi-query", action="store_true")
+    parser.add_argument("--rerank", default="off", choices=["off", "lexical", "cross_encoder"])
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write JSON here instead of stdout")
+    parser.add_argument("--single", action="store_true", help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+
+def _config(args):
+    return {key: value for key, value in vars(args).items() if key not in ("output", "single")}
+
+
+def _child_argv(args, pages, output):
+    argv = ["--single", "--pages", str(pages), "--output", output]
+
+    for key, value in _config(args).items():
+        flag = "--" + key.replace("_", "-")
+        if key == "pages" or value is False:
+            continue
+        argv += [flag] if value is True else [flag, str(value)]
+
+    return argv
+
+
+def main(argv=None):
+    args = _parse_args(argv)
+
+    if args.single:
+        result = run_size(int(args.pages), args)
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(result, f)
+        return
+
+    runs = []
+
+    for pages in [int(p) for p in args.pages.split(",") if p.strip()]:
+        print(f"⏱️ Benchmarking {pages} pages...", file=sys.stderr)
+
+        with tempfile.NamedTemporaryFile(suffix=".json", delete=False) as tmp:
+            result_path = tmp.name
+
+        # A fresh interpreter per size keeps peak RSS and caches independent.
+        subprocess.run(
+            [sys.executable, "-m", "benchmarks.run_pipeline", *_child_argv(args, pages, result_path)],
+            check=True,
+            stdout=sys.stderr,
+        )
+
+        with open(result_path, encoding="utf-8") as f:
+            runs.append(json.load(f))
+        os.remove(result_path)
+
+    report = json.dumps({"config": _config(args), "runs": runs}, indent=2)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(report)
+    else:
+        print(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -4,6 +4,8 @@ from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_community.vectorstores import FAISS
 from dotenv import load_dotenv
 
+from utils.query_rewrite import parse_rewritten_queries
+
 load_dotenv()
 
 # Load docs
@@ -40,27 +42,7 @@ Generate 3 different versions of this question to improve document retrieval:
 
 rewrite_result = llm.invoke(rewrite_prompt)
 
-raw_lines = rewrite_result.content.split("\n")
-
-queries = []
-for line in raw_lines:
-    line = line.strip()
-
-    # remove bullets, numbering, empty lines
-    if not line:
-        continue
-    if line.startswith("-"):
-        continue
-    if line.lower().startswith("here are"):
-        continue
-    if "improvement" in line.lower():
-        continue
-
-    # remove numbering like "1. ..."
-    if line[0].isdigit() and "." in line:
-        line = line.split(".", 1)[1].strip()
-
-    queries.append(line)
+queries = parse_rewritten_queries(rewrite_result.content)
 
 # fallback: if nothing parsed, use original query
 if not queries:
@@ -76,8 +58,11 @@ print("\nRetrieved Documents:")
 seen = set()
 all_docs = []
 
-for q in queries:
-    docs = vectorstore.similarity_search(q, k=2)
+# Embed every query variant in a single batched request
+query_vectors = embeddings.embed_documents(queries, task_type="RETRIEVAL_QUERY")
+
+for q_vector in query_vectors:
+    docs = vectorstore.similarity_search_by_vector(q_vector, k=2)
     for doc in docs:
         key = doc.page_content
         if key not in seen:
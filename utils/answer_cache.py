@@ -0,0 +1,188 @@
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+import numpy as np
+from dotenv import load_dotenv
+from langchain_core.documents import Document
+
+load_dotenv()
+
+
+# --------------------------------------------------
+# ⚙️ CONFIG
+# --------------------------------------------------
+
+ANSWER_CACHE_PATH = os.getenv("ANSWER_CACHE_PATH", "data/answer_cache.sqlite3")
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "1000"))
+ANSWER_CACHE_TTL_SECONDS = float(os.getenv("ANSWER_CACHE_TTL_SECONDS", "86400"))
+
+# Cosine similarity needed for a near-identical question to count as a hit.
+# 0 disables the embedding lookup and only exact (normalised) matches are served.
+ANSWER_CACHE_SIMILARITY = float(os.getenv("ANSWER_CACHE_SIMILARITY", "0"))
+
+
+# --------------------------------------------------
+# 🔤 NORMALISATION
+# --------------------------------------------------
+
+def normalize_question(question):
+    """Lower-case, collapse whitespace and drop trailing punctuation."""
+    text = re.sub(r"\s+", " ", question.strip().lower())
+    return text.rstrip(" ?!.")
+
+
+def _dump_docs(docs):
+    return json.dumps([
+        {"id": getattr(doc, "id", None), "page_content": doc.page_content, "metadata": doc.metadata}
+        for doc in docs
+    ])
+
+
+def _load_docs(payload):
+    return [Document(**item) for item in json.loads(payload)]
+
+
+# --------------------------------------------------
+# 💬 ANSWER CACHE
+# --------------------------------------------------
+
+class AnswerCache:
+    """
+    Persistent answer cache keyed on (index fingerprint, normalised question).
+
+    Entries expire after `ttl` seconds and the least recently used ones are
+    evicted beyond `max_entries`. With a similarity threshold set, a miss falls
+    back to the closest cached question (by embedding) for the same index.
+    """
+
+    def __init__(
+        self,
+        path=ANSWER_CACHE_PATH,
+        max_entries=ANSWER_CACHE_MAX_ENTRIES,
+        ttl=ANSWER_CACHE_TTL_SECONDS,
+        similarity=ANSWER_CACHE_SIMILARITY,
+    ):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.similarity = similarity
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS answers (
+                    fingerprint TEXT NOT NULL,
+                    question TEXT NOT NULL,
+                    answer TEXT NOT NULL,
+                    sources TEXT NOT NULL,
+                    embedding BLOB,
+                    created_at REAL NOT NULL,
+                    last_used REAL NOT NULL,
+                    PRIMARY KEY (fingerprint, question)
+                )
+                """
+            )
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    @property
+    def semantic(self):
+        return self.similarity > 0
+
+    def lookup(self, fingerprint, question, embed_query=None):
+        """
+        Return ((answer, docs) or None, question vector or None).
+        The vector is handed back so `store` does not embed the question twice.
+        """
+        key = normalize_question(question)
+        now = time.time()
+        oldest = now - self.ttl
+
+        with self._lock, self._connect() as conn:
+            row = conn.execute(
+                "SELECT answer, sources FROM answers WHERE fingerprint = ? AND question = ? AND created_at >= ?",
+                (fingerprint, key, oldest),
+            ).fetchone()
+
+            if row:
+                conn.execute(
+                    "UPDATE answers SET last_used = ? WHERE fingerprint = ? AND question = ?",
+                    (now, fingerprint, key),
+                )
+                return (row[0], _load_docs(row[1])), None
+
+        if not (self.semantic and embed_query):
+            return None, None
+
+        vector = np.asarray(embed_query(key), dtype=np.float32)
+        vector /= np.linalg.norm(vector) or 1.0
+
+        with self._lock, self._connect() as conn:
+            rows = conn.execute(
+                "SELECT question, answer, sources, embedding FROM answers "
+                "WHERE fingerprint = ? AND created_at >= ? AND embedding IS NOT NULL",
+                (fingerprint, oldest),
+            ).fetchall()
+
+            best = None
+            best_score = self.similarity
+            for cached_question, answer, sources, blob in rows:
+                score = float(np.dot(vector, np.frombuffer(blob, dtype=np.float32)))
+                if score >= best_score:
+                    best, best_score = (cached_question, answer, sources), score
+
+            if best:
+                conn.execute(
+                    "UPDATE answers SET last_used = ? WHERE fingerprint = ? AND question = ?",
+                    (now, fingerprint, best[0]),
+                )
+                print(f"⚡ Semantic answer cache hit ({best_score:.3f}): {best[0]!r}")
+                return (best[1], _load_docs(best[2])), vector
+
+        return None, vector
+
+    def store(self, fingerprint, question, answer, docs, vector=None):
+        key = normalize_question(question)
+        now = time.time()
+        blob = np.asarray(vector, dtype=np.float32).tobytes() if vector is not None else None
+
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO answers "
+                "(fingerprint, question, answer, sources, embedding, created_at, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (fingerprint, key, answer, _dump_docs(docs), blob, now, now),
+            )
+
+            # TTL expiry, then LRU eviction beyond the size cap.
+            conn.execute("DELETE FROM answers WHERE created_at < ?", (now - self.ttl,))
+            conn.execute(
+                "DELETE FROM answers WHERE rowid IN ("
+                "SELECT rowid FROM answers ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+
+    def clear(self, fingerprint=None):
+        with self._lock, self._connect() as conn:
+            if fingerprint is None:
+                conn.execute("DELETE FROM answers")
+            else:
+                conn.execute("DELETE FROM answers WHERE fingerprint = ?", (fingerprint,))
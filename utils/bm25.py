@@ -0,0 +1,161 @@
+import math
+import os
+import re
+import sqlite3
+import threading
+from collections import Counter
+
+from utils.index_versions import current_dir
+
+KEYWORD_FILE = "keyword.sqlite3"
+
+# Standard Okapi BM25 parameters.
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Keeps identifiers such as "4.2.1", "AB-1234" or "src/app.py" as single terms.
+_TOKEN_RE = re.compile(r"\w+(?:[.\-/]\w+)*")
+
+_STOPWORDS = frozenset(
+    "a an and are as at be by for from has have how i in is it its of on or "
+    "that the this to was were what when where which who why will with".split()
+)
+
+
+def tokenize(text):
+    return [
+        token for token in _TOKEN_RE.findall(text.lower())
+        if token not in _STOPWORDS
+    ]
+
+
+# --------------------------------------------------
+# 🔤 BM25 INVERTED INDEX (SQLITE)
+# --------------------------------------------------
+
+class BM25Index:
+    """
+    Persistent inverted index over chunk text, keyed by the same docstore ids
+    as the FAISS index so the two can be updated and fused chunk by chunk.
+    Postings are read per query term, so nothing is loaded up front.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+
+        with self._lock, self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS postings ("
+                "term TEXT NOT NULL, doc_id TEXT NOT NULL, tf INTEGER NOT NULL, "
+                "PRIMARY KEY (term, doc_id)) WITHOUT ROWID"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS postings_doc ON postings (doc_id)")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS docs (doc_id TEXT PRIMARY KEY, length INTEGER NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS stats (key TEXT PRIMARY KEY, value INTEGER NOT NULL)"
+            )
+            self._conn.execute("INSERT OR IGNORE INTO stats VALUES ('docs', 0), ('length', 0)")
+
+    def close(self):
+        self._conn.close()
+
+    def add(self, ids, texts):
+        postings = []
+        docs = []
+        total_length = 0
+
+        for doc_id, text in zip(ids, texts):
+            terms = Counter(tokenize(text))
+            length = sum(terms.values())
+            total_length += length
+            docs.append((doc_id, length))
+            postings.extend((term, doc_id, tf) for term, tf in terms.items())
+
+        with self._lock, self._conn:
+            self._conn.executemany("INSERT INTO docs VALUES (?, ?)", docs)
+            self._conn.executemany("INSERT INTO postings VALUES (?, ?, ?)", postings)
+            self._update_stats(len(docs), total_length)
+
+    def delete(self, ids):
+        with self._lock, self._conn:
+            removed = 0
+            removed_length = 0
+
+            for doc_id in ids:
+                row = self._conn.execute("SELECT length FROM docs WHERE doc_id = ?", (doc_id,)).fetchone()
+                if row is None:
+                    continue
+                removed += 1
+                removed_length += row[0]
+                self._conn.execute("DELETE FROM docs WHERE doc_id = ?", (doc_id,))
+                self._conn.execute("DELETE FROM postings WHERE doc_id = ?", (doc_id,))
+
+            self._update_stats(-removed, -removed_length)
+
+    def _update_stats(self, docs_delta, length_delta):
+        self._conn.execute("UPDATE stats SET value = value + ? WHERE key = 'docs'", (docs_delta,))
+        self._conn.execute("UPDATE stats SET value = value + ? WHERE key = 'length'", (length_delta,))
+
+    def search(self, query, k=20):
+        """Return [(doc_id, score)] best first."""
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms:
+            return []
+
+        placeholders = ",".join("?" * len(terms))
+
+        with self._lock:
+            stats = dict(self._conn.execute("SELECT key, value FROM stats"))
+            n_docs = stats.get("docs", 0)
+            if n_docs == 0:
+                return []
+            avg_length = stats.get("length", 0) / n_docs or 1.0
+
+            doc_freq = dict(self._conn.execute(
+                f"SELECT term, COUNT(*) FROM postings WHERE term IN ({placeholders}) GROUP BY term",
+                terms,
+            ))
+            rows = self._conn.execute(
+                f"SELECT p.term, p.doc_id, p.tf, d.length FROM postings p "
+                f"JOIN docs d ON d.doc_id = p.doc_id WHERE p.term IN ({placeholders})",
+                terms,
+            ).fetchall()
+
+        scores = Counter()
+        for term, doc_id, tf, length in rows:
+            df = doc_freq[term]
+            idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+            norm = tf + BM25_K1 * (1 - BM25_B + BM25_B * length / avg_length)
+            scores[doc_id] += idf * tf * (BM25_K1 + 1) / norm
+
+        return scores.most_common(k)
+
+    def terms_for(self, doc_id, terms):
+        """Which of `terms` occur in the given chunk."""
+        if not terms:
+            return set()
+        placeholders = ",".join("?" * len(terms))
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT term FROM postings WHERE doc_id = ? AND term IN ({placeholders})",
+                [doc_id, *terms],
+            )
+            return {row[0] for row in rows}
+
+
+def keyword_index_path(persist_dir):
+    return os.path.join(current_dir(persist_dir), KEYWORD_FILE)
+
+
+def load_keyword_index(persist_dir, vectorstore=None):
+    """
+    The BM25 index built alongside `vectorstore` (the published one without it).
+    A session on a superseded index must not read the newer build's postings.
+    """
+    directory = getattr(vectorstore, "version_dir", None)
+    path = os.path.join(directory, KEYWORD_FILE) if directory else keyword_index_path(persist_dir)
+    return BM25Index(path) if os.path.exists(path) else None
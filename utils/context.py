@@ -0,0 +1,138 @@
+import os
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+# --------------------------------------------------
+# ⚙️ CONFIG
+# --------------------------------------------------
+
+# Default prompt-context budget, and optional per-model overrides such as
+# "gemini-2.5-flash=6000,openrouter/auto=2500".
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "3000"))
+CONTEXT_TOKEN_BUDGETS = os.getenv("CONTEXT_TOKEN_BUDGETS", "")
+
+# Rough characters-per-token ratio for English text; avoids a tokenizer dependency.
+CHARS_PER_TOKEN = 4
+
+# Don't bother adding a truncated passage shorter than this many tokens.
+MIN_PASSAGE_TOKENS = 50
+
+
+def _parse_budgets(value):
+    budgets = {}
+    for item in value.split(","):
+        model, sep, tokens = item.strip().rpartition("=")
+        if sep and model and tokens.strip().isdigit():
+            budgets[model.strip()] = int(tokens)
+    return budgets
+
+
+_MODEL_BUDGETS = _parse_budgets(CONTEXT_TOKEN_BUDGETS)
+
+
+def token_budget_for(model=None):
+    return _MODEL_BUDGETS.get(model, CONTEXT_TOKEN_BUDGET)
+
+
+def estimate_tokens(text):
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+# --------------------------------------------------
+# 🧵 MERGE OVERLAPPING NEIGHBOURS
+# --------------------------------------------------
+
+def _source_label(metadata):
+    label = os.path.basename(str(metadata.get("source", ""))) or "document"
+
+    page = metadata.get("page_label") or (
+        metadata["page"] + 1 if isinstance(metadata.get("page"), int) else None
+    )
+    return f"{label} p.{page}" if page else label
+
+
+def merge_passages(docs):
+    """
+    Collapse retrieved chunks into distinct passages, best first.
+
+    Exact duplicates are dropped. Chunks from the same page whose character
+    ranges (splitter `start_index`) touch or overlap are stitched into one
+    passage, so the splitter's overlap is only sent once. Each passage keeps
+    the rank of its best-ranked chunk.
+    """
+    groups = {}
+    seen_text = set()
+
+    for rank, doc in enumerate(docs):
+        text = doc.page_content
+        if text in seen_text:
+            continue
+        seen_text.add(text)
+
+        metadata = doc.metadata or {}
+        start = metadata.get("start_index")
+        label = _source_label(metadata)
+
+        if not isinstance(start, int) or start < 0:
+            # Position unknown: nothing to merge with, keep as its own passage.
+            groups[(label, rank)] = [(rank, 0, text)]
+            continue
+
+        groups.setdefault((label, None), []).append((rank, start, text))
+
+    passages = []
+    for (label, _), spans in groups.items():
+        spans.sort(key=lambda span: span[1])
+
+        rank, start, text = spans[0]
+        end = start + len(text)
+
+        for next_rank, next_start, next_text in spans[1:]:
+            if next_start <= end:
+                text += next_text[end - next_start:]
+                end = max(end, next_start + len(next_text))
+                rank = min(rank, next_rank)
+            else:
+                passages.append((rank, label, text))
+                rank, start, text = next_rank, next_start, next_text
+                end = start + len(text)
+
+        passages.append((rank, label, text))
+
+    passages.sort(key=lambda passage: passage[0])
+    return [(label, text) for _, label, text in passages]
+
+
+# --------------------------------------------------
+# 📝 TOKEN-BUDGETED CONTEXT
+# --------------------------------------------------
+
+def build_context(docs, model=None, budget_tokens=None):
+    """
+    Compact prompt context from retrieved documents: merged, de-duplicated
+    passages in rank order, each prefixed with a short source label, cut off
+    at the model's token budget.
+    """
+    budget = budget_tokens or token_budget_for(model)
+    parts = []
+    used = 0
+
+    for i, (label, text) in enumerate(merge_passages(docs), start=1):
+        header = f"[{i}] {label}\n"
+        text = " ".join(text.split())
+        cost = estimate_tokens(header + text) + 1
+
+        if used + cost > budget:
+            remaining = budget - used - estimate_tokens(header) - 1
+            if remaining >= MIN_PASSAGE_TOKENS:
+                cut = text[:remaining * CHARS_PER_TOKEN].rsplit(" ", 1)[0]
+                parts.append(header + cut + " …")
+            break
+
+        parts.append(header + text)
+        used += cost
+
+    return "\n\n".join(parts)
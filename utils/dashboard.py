@@ -0,0 +1,118 @@
+from utils.index_factory import index_memory_bytes
+from utils.provider_health import provider_health
+from utils.tracing import LATENCY_BUCKETS, metrics, percentile
+
+
+# --------------------------------------------------
+# 📈 PERFORMANCE DASHBOARD DATA
+# --------------------------------------------------
+# Everything here reads the process-wide metrics store, so the Analytics tab
+# shows all sessions' traffic, not just the viewer's own.
+
+def _ms(seconds):
+    return None if seconds is None else round(seconds * 1000, 1)
+
+
+def _summary(values):
+    return {
+        "n": len(values),
+        "p50_ms": _ms(percentile(values, 50)),
+        "p95_ms": _ms(percentile(values, 95)),
+        "p99_ms": _ms(percentile(values, 99)),
+    }
+
+
+def _merged(samples):
+    return [value for values in samples.values() for value in values]
+
+
+def stage_latencies():
+    """[{stage, n, p50_ms, p95_ms, p99_ms}] over the recent window, slowest p95 first."""
+    rows = [
+        {"stage": dict(labels).get("stage", "?"), **_summary(values)}
+        for labels, values in metrics.samples("rag_stage_seconds").items()
+        if values
+    ]
+    return sorted(rows, key=lambda row: row["p95_ms"] or 0, reverse=True)
+
+
+def latency_histogram(stage):
+    """{bucket label: count} of recent samples for one stage."""
+    values = metrics.samples("rag_stage_seconds").get((("stage", stage),), [])
+
+    labels = [f"≤{_ms(bound):g} ms" for bound in LATENCY_BUCKETS] + [f">{_ms(LATENCY_BUCKETS[-1]):g} ms"]
+    counts = dict.fromkeys(labels, 0)
+
+    for value in values:
+        index = next((i for i, bound in enumerate(LATENCY_BUCKETS) if value <= bound), len(LATENCY_BUCKETS))
+        counts[labels[index]] += 1
+
+    return counts
+
+
+def cache_hit_rates():
+    """{cache name: {hits, misses, hit_rate}} for every instrumented cache."""
+    hits = {dict(labels).get("cache"): value for labels, value in metrics.counters("rag_cache_hits_total").items()}
+    misses = {dict(labels).get("cache"): value for labels, value in metrics.counters("rag_cache_misses_total").items()}
+
+    rates = {}
+    for cache in sorted(set(hits) | set(misses)):
+        total = hits.get(cache, 0) + misses.get(cache, 0)
+        rates[cache] = {
+            "hits": hits.get(cache, 0),
+            "misses": misses.get(cache, 0),
+            "hit_rate": round(hits.get(cache, 0) / total, 3) if total else None,
+        }
+    return rates
+
+
+def provider_rows():
+    """Per-provider circuit state, latency, successes and failures (failovers)."""
+    successes = {}
+    for labels, value in metrics.counters("rag_provider_success_total").items():
+        name = dict(labels).get("provider")
+        successes[name] = successes.get(name, 0) + value
+
+    failures = {}
+    for labels, value in metrics.counters("rag_provider_failures_total").items():
+        name = dict(labels).get("provider")
+        failures[name] = failures.get(name, 0) + value
+
+    health = provider_health.snapshot()
+
+    rows = []
+    for name in sorted(set(health) | set(successes) | set(failures)):
+        stats = health.get(name, {})
+        rows.append({
+            "provider": name,
+            "state": stats.get("state", "closed"),
+            "p50_ms": _ms(stats.get("p50")),
+            "p95_ms": _ms(stats.get("p95")),
+            "error_rate": stats.get("error_rate", 0.0),
+            "successes": successes.get(name, 0),
+            "failures": failures.get(name, 0),
+        })
+    return rows
+
+
+def performance_snapshot(vectorstore=None):
+    """Headline numbers for the dashboard; `vectorstore` is the index the viewer is using."""
+    # Question to last token on both paths; the streaming `ask` span stops at the first token.
+    answer = _merged(metrics.samples("rag_answer_seconds"))
+    ttft = _merged(metrics.samples("rag_time_to_first_token_seconds"))
+
+    memory = metrics.gauge("rag_index_memory_bytes")
+    vectors = metrics.gauge("rag_index_vectors")
+    if vectorstore is not None:
+        memory = index_memory_bytes(vectorstore.index)
+        vectors = vectorstore.index.ntotal
+
+    return {
+        "answer": _summary(answer),
+        "ttft": _summary(ttft),
+        "build_chunks_per_s": metrics.gauge("rag_last_build_chunks_per_second"),
+        "build_seconds": metrics.gauge("rag_last_build_seconds"),
+        "index_vectors": vectors,
+        "index_memory_bytes": memory,
+        "failovers": sum(row["failures"] for row in provider_rows()),
+    }
@@ -0,0 +1,178 @@
+import json
+import os
+import sqlite3
+import threading
+
+from langchain_community.docstore.base import AddableMixin, Docstore
+from langchain_core.documents import Document
+
+DOCSTORE_FILE = "docstore.sqlite3"
+
+
+# --------------------------------------------------
+# 🗄️ SQLITE DOCSTORE (LAZY, PICKLE-FREE)
+# --------------------------------------------------
+# Chunk text and metadata live in SQLite and are read by id on demand, so
+# loading an index costs the id → position map only, never the corpus text.
+
+class SQLiteDocstore(Docstore, AddableMixin):
+    """
+    Read-through docstore over a SQLite file.
+
+    Adds and deletes are buffered in memory until `save_docstore` writes a new
+    file in the next version directory; this connection keeps reading its own
+    file, which is never overwritten. A `write_through` store is the one being
+    built in that new directory: adds and deletes go straight to its file.
+    """
+
+    def __init__(self, path, write_through=False):
+        self.path = path
+        self.write_through = write_through
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._deleted = set()
+
+        if write_through:
+            with self._conn:
+                _create_schema(self._conn)
+
+    def search(self, search):
+        if search in self._pending:
+            return self._pending[search]
+        if search in self._deleted:
+            return f"ID {search} not found."
+
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT content, metadata FROM documents WHERE id = ?", (search,)
+            ).fetchone()
+
+        if row is None:
+            return f"ID {search} not found."
+
+        return Document(id=search, page_content=row[0], metadata=json.loads(row[1]))
+
+    def add(self, texts):
+        if self.write_through:
+            with self._lock, self._conn:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO documents (id, content, metadata) VALUES (?, ?, ?)",
+                    _document_rows(texts.items()),
+                )
+            return
+
+        overlapping = set(texts).intersection(self._pending)
+        if overlapping:
+            raise ValueError(f"Tried to add ids that already exist: {overlapping}")
+
+        for _id, doc in texts.items():
+            # Carry the docstore id on the document so callers can dedupe by it.
+            if getattr(doc, "id", None) != _id:
+                doc = Document(id=_id, page_content=doc.page_content, metadata=doc.metadata)
+            self._pending[_id] = doc
+        self._deleted.difference_update(texts)
+
+    def delete(self, ids):
+        if self.write_through:
+            with self._lock, self._conn:
+                self._conn.executemany("DELETE FROM documents WHERE id = ?", [(_id,) for _id in ids])
+            return
+
+        for _id in ids:
+            self._pending.pop(_id, None)
+            self._deleted.add(_id)
+
+    def load_index_ids(self):
+        """FAISS position → docstore id map, as stored alongside the documents."""
+        with self._lock:
+            rows = self._conn.execute("SELECT position, doc_id FROM positions").fetchall()
+        return {position: doc_id for position, doc_id in rows}
+
+    def backup_to(self, conn):
+        with self._lock:
+            self._conn.backup(conn)
+
+    def copy_to(self, path):
+        """A write-through copy of this docstore, buffered changes applied, at `path`."""
+        conn = sqlite3.connect(path)
+        try:
+            self.backup_to(conn)
+        finally:
+            conn.close()
+
+        copy = SQLiteDocstore(path, write_through=True)
+        copy.delete(self._deleted)
+        copy.add(self._pending)
+        return copy
+
+    def write_positions(self, index_to_docstore_id):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM positions")
+            self._conn.executemany(
+                "INSERT INTO positions (position, doc_id) VALUES (?, ?)",
+                index_to_docstore_id.items(),
+            )
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def _create_schema(conn):
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS documents (id TEXT PRIMARY KEY, content TEXT NOT NULL, metadata TEXT NOT NULL)"
+    )
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS positions (position INTEGER PRIMARY KEY, doc_id TEXT NOT NULL)"
+    )
+
+
+def _document_rows(items):
+    for doc_id, doc in items:
+        yield doc_id, doc.page_content, json.dumps(doc.metadata)
+
+
+def save_docstore(docstore, index_to_docstore_id, path):
+    """
+    Write documents and the position map to a fresh SQLite file at `path`.
+    Works from either a SQLiteDocstore (copy + apply buffered changes) or a
+    LangChain InMemoryDocstore (full write). A write-through store already
+    at `path` only needs its position map.
+    """
+    if isinstance(docstore, SQLiteDocstore) and docstore.write_through and docstore.path == path:
+        docstore.write_positions(index_to_docstore_id)
+        return
+
+    if os.path.exists(path):
+        os.remove(path)
+
+    conn = sqlite3.connect(path)
+    try:
+        if isinstance(docstore, SQLiteDocstore):
+            docstore.backup_to(conn)
+
+        with conn:
+            _create_schema(conn)
+
+            if isinstance(docstore, SQLiteDocstore):
+                conn.executemany(
+                    "DELETE FROM documents WHERE id = ?",
+                    [(doc_id,) for doc_id in docstore._deleted],
+                )
+                pending = docstore._pending.items()
+            else:
+                pending = docstore._dict.items()
+
+            conn.executemany(
+                "INSERT OR REPLACE INTO documents (id, content, metadata) VALUES (?, ?, ?)",
+                _document_rows(pending),
+            )
+
+            conn.execute("DELETE FROM positions")
+            conn.executemany(
+                "INSERT INTO positions (position, doc_id) VALUES (?, ?)",
+                index_to_docstore_id.items(),
+            )
+    finally:
+        conn.close()
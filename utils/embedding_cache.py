@@ -0,0 +1,154 @@
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+# --------------------------------------------------
+# ⚙️ CONFIG
+# --------------------------------------------------
+
+CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", "data/embedding_cache.sqlite3")
+
+# SQLite caps the number of bound parameters per statement.
+_QUERY_BATCH = 500
+
+QUERY_EMBEDDING_CACHE_SIZE = int(os.getenv("QUERY_EMBEDDING_CACHE_SIZE", "2048"))
+
+
+# --------------------------------------------------
+# 🔑 CHUNK KEY
+# --------------------------------------------------
+
+def chunk_key(text, model_name):
+    """Content address of a chunk: sha256 over embedding model name + chunk text."""
+    return hashlib.sha256(f"{model_name}\0{text}".encode("utf-8")).hexdigest()
+
+
+# --------------------------------------------------
+# 💾 PERSISTENT EMBEDDING CACHE
+# --------------------------------------------------
+
+class EmbeddingCache:
+    """
+    On-disk store of embedding vectors keyed by `chunk_key`.
+    Vectors are kept as raw float32 blobs so a cache hit never touches the provider.
+    """
+
+    def __init__(self, path=CACHE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS embeddings (
+                    key TEXT PRIMARY KEY,
+                    model TEXT NOT NULL,
+                    dim INTEGER NOT NULL,
+                    vector BLOB NOT NULL
+                )
+                """
+            )
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def get_many(self, keys):
+        """Return {key: np.ndarray[float32]} for every key present in the cache."""
+        keys = list(dict.fromkeys(keys))
+        found = {}
+
+        with self._connect() as conn:
+            for start in range(0, len(keys), _QUERY_BATCH):
+                batch = keys[start:start + _QUERY_BATCH]
+                placeholders = ",".join("?" * len(batch))
+                rows = conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})",
+                    batch,
+                )
+                for key, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype=np.float32)
+
+        return found
+
+    def put_many(self, items, model_name):
+        """Store {key: vector} pairs. Existing keys are left untouched."""
+        rows = []
+        for key, vector in items.items():
+            arr = np.asarray(vector, dtype=np.float32)
+            rows.append((key, model_name, int(arr.shape[0]), arr.tobytes()))
+
+        if not rows:
+            return
+
+        with self._lock, self._connect() as conn:
+            conn.executemany(
+                "INSERT OR IGNORE INTO embeddings (key, model, dim, vector) VALUES (?, ?, ?, ?)",
+                rows,
+            )
+
+    def __len__(self):
+        with self._connect() as conn:
+            return conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+
+# --------------------------------------------------
+# 🔍 QUERY EMBEDDING CACHE (IN-MEMORY LRU)
+# --------------------------------------------------
+
+def normalize_query(text):
+    """Collapse whitespace and case so trivially different phrasings share one embedding."""
+    return re.sub(r"\s+", " ", text.strip().lower())
+
+
+class QueryEmbeddingCache:
+    """Process-wide LRU of query vectors keyed on (model name, normalised text)."""
+
+    def __init__(self, max_size=QUERY_EMBEDDING_CACHE_SIZE):
+        self.max_size = max_size
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, model_name, text):
+        key = (model_name, text)
+        with self._lock:
+            vector = self._items.get(key)
+            if vector is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return vector
+
+    def put(self, model_name, text, vector):
+        key = (model_name, text)
+        with self._lock:
+            self._items[key] = vector
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+
+
+query_embedding_cache = QueryEmbeddingCache()
@@ -0,0 +1,126 @@
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from dotenv import load_dotenv
+
+from utils.errors import is_rate_limit_error
+from utils.tracing import metrics
+
+load_dotenv()
+
+
+# --------------------------------------------------
+# ⚙️ CONFIG
+# --------------------------------------------------
+
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "100"))
+EMBED_MAX_WORKERS = int(os.getenv("EMBED_MAX_WORKERS", "4"))
+EMBED_REQUESTS_PER_MINUTE = float(os.getenv("EMBED_REQUESTS_PER_MINUTE", "150"))
+EMBED_MAX_RETRIES = int(os.getenv("EMBED_MAX_RETRIES", "5"))
+EMBED_BACKOFF_SECONDS = float(os.getenv("EMBED_BACKOFF_SECONDS", "2"))
+
+
+# --------------------------------------------------
+# 🪣 TOKEN BUCKET RATE LIMITER
+# --------------------------------------------------
+
+class TokenBucket:
+    """Thread-safe token bucket: `rate` tokens per second, bursts up to `capacity`."""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, tokens=1):
+        """Block until `tokens` are available, then take them."""
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                wait = (tokens - self._tokens) / self.rate
+
+            time.sleep(wait)
+
+
+_buckets = {}
+_buckets_lock = threading.Lock()
+
+
+def get_rate_limiter(provider):
+    """One shared bucket per provider so concurrent builds respect the same quota."""
+    with _buckets_lock:
+        if provider not in _buckets:
+            _buckets[provider] = TokenBucket(EMBED_REQUESTS_PER_MINUTE / 60.0)
+        return _buckets[provider]
+
+
+# --------------------------------------------------
+# 🚚 BATCHED, CONCURRENT EMBEDDING
+# --------------------------------------------------
+
+def _embed_batch_with_retry(batch, embeddings, limiter, max_retries):
+    for attempt in range(max_retries + 1):
+        limiter.acquire()
+
+        try:
+            return embeddings.embed_documents(batch)
+        except Exception as e:
+            if not is_rate_limit_error(e) or attempt == max_retries:
+                raise
+
+            delay = EMBED_BACKOFF_SECONDS * (2 ** attempt) * (0.5 + random.random())
+            print(f"⚠️ Embedding rate limited, retrying batch in {delay:.1f}s")
+            metrics.incr("rag_embedding_retries_total")
+            time.sleep(delay)
+
+
+def embed_in_batches(
+    texts,
+    embeddings,
+    provider="gemini",
+    batch_size=None,
+    max_workers=None,
+    max_retries=None,
+    on_batch=None,
+):
+    """
+    Embed `texts` in fixed-size batches over a bounded thread pool.
+
+    Every request goes through the provider's token bucket; 429s are retried
+    per batch with jittered exponential backoff. `on_batch(texts, vectors)` is
+    called as each batch completes so callers can persist partial progress.
+    Returns vectors in the same order as `texts`.
+    """
+    batch_size = batch_size or EMBED_BATCH_SIZE
+    max_workers = max_workers or EMBED_MAX_WORKERS
+    max_retries = EMBED_MAX_RETRIES if max_retries is None else max_retries
+    limiter = get_rate_limiter(provider)
+
+    batches = [texts[i:i + batch_size] for i in range(0, len(texts), batch_size)]
+
+    if not batches:
+        return []
+
+    def run(batch):
+        vectors = _embed_batch_with_retry(batch, embeddings, limiter, max_retries)
+        if on_batch is not None:
+            on_batch(batch, vectors)
+        return vectors
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(batches))) as pool:
+        results = list(pool.map(run, batches))
+
+    return [vector for vectors in results for vector in vectors]
@@ -1,57 +1,254 @@
 import os
 from dotenv import load_dotenv
 
+import faiss
+
+from langchain_core.embeddings import Embeddings
 from langchain_google_genai import GoogleGenerativeAIEmbeddings
 from langchain_community.vectorstores import FAISS
 
+from utils.docstore import DOCSTORE_FILE, SQLiteDocstore, save_docstore
+from utils.embedding_cache import chunk_key, normalize_query, query_embedding_cache
+from utils.embedding_pipeline import embed_in_batches
+from utils.index_factory import configure_search, truncate_vectors
+from utils.index_versions import current_dir
+from utils.resources import get_embedding_cache
+from utils.tracing import metrics, span
+
 load_dotenv()
 
+# Memory-map persisted indexes on load so several worker processes share pages.
+VECTORSTORE_MMAP = os.getenv("VECTORSTORE_MMAP", "false").lower() in ("1", "true", "yes")
+
+# Newer FAISS releases can map flat index codes directly (IO_FLAG_MMAP_IFC).
+_MMAP_FLAG = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP)
+
+# Index width for Matryoshka-style truncation (e.g. 768 / 1536); 0 keeps full width.
+EMBEDDING_DIM = int(os.getenv("EMBEDDING_DIM", "0"))
+
 
 # --------------------------------------------------
 # 🧠 EMBEDDING FACTORY (FOR FUTURE MODEL SWITCHING)
 # --------------------------------------------------
 
+# Optional override, e.g. deterministic local embeddings for benchmarks.
+_embeddings_factory = None
+
+
+def set_embeddings_factory(factory):
+    """Build every embedding client with `factory(model_name)`; None restores Gemini."""
+    global _embeddings_factory
+    _embeddings_factory = factory
+
+
 def _get_embeddings(model_name="gemini-embedding-001"):
+    if _embeddings_factory is not None:
+        return _embeddings_factory(model_name)
     return GoogleGenerativeAIEmbeddings(model=model_name)
 
 
+# --------------------------------------------------
+# 📏 REDUCED-DIMENSION (MATRYOSHKA) VECTORS
+# --------------------------------------------------
+
+class TruncatedEmbeddings(Embeddings):
+    """
+    Embedding function the FAISS index is queried with. Provider vectors stay
+    full width (and cached that way); only what enters the index is truncated,
+    so full-precision re-ranking can still use the cached originals.
+    """
+
+    def __init__(self, base, dim=EMBEDDING_DIM, model_name="gemini-embedding-001"):
+        self.base = base
+        self.dim = dim
+        self.model_name = model_name
+
+    def embed_documents(self, texts):
+        return truncate_vectors(self.base.embed_documents(texts), self.dim).tolist()
+
+    def embed_query(self, text):
+        return self.truncate(self.embed_query_full(text))
+
+    def embed_queries(self, texts):
+        return [self.truncate(vector) for vector in self.embed_queries_full(texts)]
+
+    def embed_query_full(self, text):
+        return self.embed_queries_full([text])[0]
+
+    def embed_queries_full(self, texts):
+        """
+        Full-width query vectors via the LRU; all misses go to the provider
+        in one batched request instead of one round trip per query.
+        """
+        normalized = [normalize_query(text) for text in texts]
+        vectors = {text: query_embedding_cache.get(self.model_name, text) for text in normalized}
+
+        missing = [text for text, vector in vectors.items() if vector is None]
+        metrics.incr("rag_cache_hits_total", len(vectors) - len(missing), cache="query_embedding")
+        metrics.incr("rag_cache_misses_total", len(missing), cache="query_embedding")
+
+        if missing:
+            with span("embed_query", queries=len(missing)):
+                batch = _embed_query_batch(self.base, missing)
+            for text, vector in zip(missing, batch):
+                query_embedding_cache.put(self.model_name, text, vector)
+                vectors[text] = vector
+
+        return [vectors[text] for text in normalized]
+
+    def truncate(self, vector):
+        return truncate_vectors(vector, self.dim).tolist()
+
+
+def _embed_query_batch(base, texts):
+    if len(texts) == 1:
+        return [base.embed_query(texts[0])]
+
+    try:
+        # Gemini distinguishes query and document embeddings by task type.
+        return base.embed_documents(texts, task_type="RETRIEVAL_QUERY")
+    except TypeError:
+        return base.embed_documents(texts)
+
+
+def _get_index_embeddings(model_name="gemini-embedding-001"):
+    return TruncatedEmbeddings(_get_embeddings(model_name), EMBEDDING_DIM, model_name)
+
+
+# --------------------------------------------------
+# ♻️ CACHED EMBEDDING
+# --------------------------------------------------
+
+def embed_texts(texts, embeddings, model_name="gemini-embedding-001", cache=None):
+    """
+    Embed texts through the content-addressed cache.
+    Only chunks never seen before (for this model) are sent to the provider.
+    """
+    if cache is None:
+        cache = get_embedding_cache()
+
+    with span("embed", chunks=len(texts)) as embed_span:
+        keys = [chunk_key(text, model_name) for text in texts]
+        vectors = cache.get_many(keys)
+
+        # De-duplicate misses so repeated chunks are embedded once.
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in vectors and key not in missing:
+                missing[key] = text
+
+        print(f"🧠 Embedding {len(missing)} new chunks ({len(texts) - len(missing)} cached)")
+        embed_span.set(cache_hits=len(texts) - len(missing), embedded=len(missing))
+        metrics.incr("rag_cache_hits_total", len(texts) - len(missing), cache="embedding")
+        metrics.incr("rag_cache_misses_total", len(missing), cache="embedding")
+
+        if missing:
+            missing_keys = list(missing.keys())
+            missing_texts = list(missing.values())
+
+            # Persist each finished batch so a failed build resumes where it stopped.
+            def store_batch(batch_texts, batch_vectors):
+                batch_keys = [chunk_key(text, model_name) for text in batch_texts]
+                cache.put_many(dict(zip(batch_keys, batch_vectors)), model_name)
+
+            fresh = embed_in_batches(missing_texts, embeddings, on_batch=store_batch)
+            vectors.update(zip(missing_keys, fresh))
+            metrics.incr("rag_embedded_chunks_total", len(missing))
+
+    return [list(map(float, vectors[key])) for key in keys]
+
+
 # --------------------------------------------------
 # 💾 CREATE VECTORSTORE
 # --------------------------------------------------
 
-def create_vectorstore(chunks, persist_dir, model_name="gemini-embedding-001"):
+def build_vectorstore(chunks, model_name="gemini-embedding-001", ids=None):
+    """Embed `chunks` (through the cache) into a new in-memory FAISS index."""
     if not chunks:
         raise ValueError("No document chunks found. Upload files with readable text before creating embeddings.")
 
-    os.makedirs(persist_dir, exist_ok=True)
+    embeddings = _get_index_embeddings(model_name)
+
+    if embeddings is None:
+        raise RuntimeError("Failed to initialize embeddings model.")
+
+    texts = [chunk.page_content for chunk in chunks]
+    vectors = truncate_vectors(embed_texts(texts, embeddings.base, model_name), EMBEDDING_DIM)
+
+    return FAISS.from_embeddings(
+        list(zip(texts, vectors)),
+        embeddings,
+        metadatas=[chunk.metadata for chunk in chunks],
+        ids=ids,
+    )
+
 
-    print("🧠 Creating fresh embeddings...")
+# --------------------------------------------------
+# ➕ ADD TO EXISTING VECTORSTORE
+# --------------------------------------------------
+
+def add_to_vectorstore(db, chunks, ids=None, model_name="gemini-embedding-001"):
+    if not chunks:
+        return []
 
     embeddings = _get_embeddings(model_name)
 
-    if embeddings is None:
-        raise RuntimeError("Failed to initialize embeddings model.")
+    texts = [chunk.page_content for chunk in chunks]
+    vectors = truncate_vectors(embed_texts(texts, embeddings, model_name), EMBEDDING_DIM)
 
-    db = FAISS.from_documents(chunks, embeddings)
+    return db.add_embeddings(
+        list(zip(texts, vectors)),
+        metadatas=[chunk.metadata for chunk in chunks],
+        ids=ids,
+    )
 
-    db.save_local(persist_dir)
 
-    return db
+# --------------------------------------------------
+# 💾 SAVE VECTORSTORE (VERSIONED, PICKLE-FREE)
+# --------------------------------------------------
+# Layout: index.faiss holds the raw vectors (memory-mappable); docstore.sqlite3
+# holds chunk text, metadata and the FAISS position → id map, read lazily by id.
+# Both live in a version directory under the persist dir (utils/index_versions.py).
+
+INDEX_FILE = "index.faiss"
+
+
+def save_vectorstore(db, directory):
+    """
+    Write `db` into `directory`: a new, not yet published version dir, so
+    files other sessions or processes have open or memory-mapped are never
+    replaced (which Windows would refuse).
+    """
+    os.makedirs(directory, exist_ok=True)
+
+    faiss.write_index(db.index, os.path.join(directory, INDEX_FILE))
+    save_docstore(db.docstore, db.index_to_docstore_id, os.path.join(directory, DOCSTORE_FILE))
 
 
 # --------------------------------------------------
 # 📦 LOAD VECTORSTORE
 # --------------------------------------------------
 
-def load_vectorstore(persist_dir, model_name="gemini-embedding-001"):
+def load_vectorstore(persist_dir, model_name="gemini-embedding-001", mmap=False):
+    """
+    Load a persisted index without unpickling anything. Chunk text stays on
+    disk until a search reads it. With `mmap=True` the FAISS file is
+    memory-mapped read-only so worker processes share its pages. The
+    returned store remembers its version dir as `version_dir`, so companion
+    files (the keyword index) come from the same build.
+    """
 
-    embeddings = _get_embeddings(model_name)
+    embeddings = _get_index_embeddings(model_name)
+    directory = current_dir(persist_dir)
 
-    return FAISS.load_local(
-        persist_dir,
-        embeddings,
-        allow_dangerous_deserialization=True,
-    )
+    flags = _MMAP_FLAG if mmap else 0
+    index = configure_search(faiss.read_index(os.path.join(directory, INDEX_FILE), flags))
+
+    docstore = SQLiteDocstore(os.path.join(directory, DOCSTORE_FILE))
+
+    db = FAISS(embeddings, index, docstore, docstore.load_index_ids())
+    db.version_dir = directory
+    return db
 
 
 # --------------------------------------------------
@@ -59,4 +256,10 @@ def load_vectorstore(persist_dir, model_name="gemini-embedding-001"):
 # --------------------------------------------------
 
 def vectorstore_exists(path: str) -> bool:
-    return os.path.exists(path) and len(os.listdir(path)) > 0
+    # Legacy pickle-based stores (index.pkl) are deliberately not recognised;
+    # they are rebuilt, which is cheap thanks to the embedding cache.
+    directory = current_dir(path)
+    return (
+        os.path.exists(os.path.join(directory, INDEX_FILE))
+        and os.path.exists(os.path.join(directory, DOCSTORE_FILE))
+    )
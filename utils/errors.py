@@ -0,0 +1,16 @@
+# --------------------------------------------------
+# PROVIDER ERROR CLASSIFICATION
+# --------------------------------------------------
+
+RATE_LIMIT_MARKERS = (
+    "resource_exhausted",
+    "quota",
+    "rate limit",
+    "429",
+)
+
+
+def is_rate_limit_error(error):
+    """True for recoverable quota / rate-limit errors (HTTP 429 and friends)."""
+    msg = str(error).lower()
+    return any(marker in msg for marker in RATE_LIMIT_MARKERS)
@@ -1,4 +1,7 @@
 import hashlib
+import os
+
+SUPPORTED_EXTENSIONS = (".pdf", ".txt")
 
 
 def hash_files(files):
@@ -10,3 +13,65 @@ def hash_files(files):
             hasher.update(f.read())
 
     return hasher.hexdigest()
+
+
+def hash_file(path, block_size=1 << 20):
+    """sha256 of a single file, read in blocks so large PDFs are not loaded at once."""
+
+    hasher = hashlib.sha256()
+
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            hasher.update(block)
+
+    return hasher.hexdigest()
+
+
+def scan_folder(folder, known=None):
+    """
+    {filename: {"hash", "size", "mtime_ns"}} for every indexable file in `folder`.
+
+    A file whose size and mtime still match its `known` entry (e.g. from an
+    index manifest) reuses the recorded hash instead of being read again.
+    """
+
+    known = known or {}
+    scanned = {}
+
+    for filename in sorted(os.listdir(folder)):
+        if not filename.lower().endswith(SUPPORTED_EXTENSIONS):
+            continue
+
+        path = os.path.join(folder, filename)
+
+        # Stat before hashing: a write in between leaves a stale stat, which only costs a re-hash later.
+        stat = os.stat(path)
+        entry = known.get(filename) or {}
+
+        if "hash" in entry and entry.get("size") == stat.st_size and entry.get("mtime_ns") == stat.st_mtime_ns:
+            file_hash = entry["hash"]
+        else:
+            file_hash = hash_file(path)
+
+        scanned[filename] = {"hash": file_hash, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+    return scanned
+
+
+def build_manifest(folder, known=None):
+    """Map every indexable file name in `folder` to its content hash."""
+
+    return {name: entry["hash"] for name, entry in scan_folder(folder, known).items()}
+
+
+def diff_manifests(previous, current):
+    """Compare two {filename: hash} manifests → (added, changed, removed) file names."""
+
+    added = [name for name in current if name not in previous]
+    removed = [name for name in previous if name not in current]
+    changed = [
+        name for name in current
+        if name in previous and previous[name] != current[name]
+    ]
+
+    return added, changed, removed
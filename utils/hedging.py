@@ -0,0 +1,198 @@
+import contextvars
+import os
+import queue
+import threading
+import time
+
+from dotenv import load_dotenv
+
+from utils.errors import is_rate_limit_error
+from utils.provider_health import provider_health
+
+load_dotenv()
+
+
+# --------------------------------------------------
+# ⚙️ CONFIG
+# --------------------------------------------------
+
+HEDGE_REQUESTS = os.getenv("HEDGE_REQUESTS", "false").lower() in ("1", "true", "yes")
+
+# Seconds to wait for a first token before hedging; 0 = p95 of the provider's recent time to first token.
+HEDGE_DELAY_SECONDS = float(os.getenv("HEDGE_DELAY_SECONDS", "0"))
+
+# Used while a provider has no latency history yet, and as a floor for the p95 delay.
+HEDGE_DEFAULT_DELAY = float(os.getenv("HEDGE_DEFAULT_DELAY", "2.0"))
+HEDGE_MIN_DELAY = float(os.getenv("HEDGE_MIN_DELAY", "0.25"))
+
+# A provider with no first token after this many seconds counts as failed (0 = wait forever).
+FIRST_TOKEN_TIMEOUT = float(os.getenv("FIRST_TOKEN_TIMEOUT", "30"))
+
+
+def hedge_delay(name):
+    if HEDGE_DELAY_SECONDS > 0:
+        return HEDGE_DELAY_SECONDS
+
+    p95 = provider_health.latency_percentile(name, 95)
+    if p95 is None:
+        return HEDGE_DEFAULT_DELAY
+    return max(HEDGE_MIN_DELAY, p95)
+
+
+# --------------------------------------------------
+# 🏁 FIRST-TOKEN RACE
+# --------------------------------------------------
+
+class _Attempt:
+    """One provider's stream, driven to its first token on a worker thread."""
+
+    def __init__(self, name, start_stream, results, race):
+        self.name = name
+        self.start_stream = start_stream
+        self.results = results
+        self.race = race
+        self.thread = threading.Thread(
+            target=contextvars.copy_context().run,
+            args=(self._run,),
+            name=f"hedge-{name}",
+            daemon=True,
+        )
+
+    def _run(self):
+        started = time.monotonic()
+        try:
+            tokens = self.start_stream()
+            first = next(tokens, "")
+        except Exception as e:
+            if self.race.winner is self.race:
+                # Already reported as timed out.
+                return
+            if self.race.winner is not None:
+                # Nobody is waiting on this attempt any more; just keep the stats honest.
+                provider_health.record_failure(self.name, rate_limited=is_rate_limit_error(e))
+            else:
+                self.results.put((self, None, None, e))
+            return
+
+        provider_health.record_success(self.name, time.monotonic() - started)
+
+        # Only the first finisher wins; a loser closes its stream, which
+        # closes the underlying HTTP response instead of reading it to the end.
+        if not self.race.claim(self):
+            print(f"🏁 Cancelling slower hedge on {self.name}")
+            tokens.close()
+            return
+
+        self.results.put((self, first, tokens, None))
+
+
+class _Race:
+    def __init__(self):
+        self.winner = None
+        self._lock = threading.Lock()
+
+    def claim(self, attempt):
+        with self._lock:
+            if self.winner is None:
+                self.winner = attempt
+            return self.winner is attempt
+
+
+def race_first_token(candidates, on_failure, acquire=None, timeout=FIRST_TOKEN_TIMEOUT):
+    """
+    Stream from `candidates` ([(name, start_stream)], best first), hedging.
+
+    The first candidate starts immediately. If it has not produced a first
+    token within its hedge delay, or fails, the next one starts too; the
+    first to yield a token wins and the others are cancelled. Failures are
+    passed to `on_failure(name, error)`. With `acquire(name)`, a candidate
+    is only started if it returns True (circuit-breaker probe slots are
+    claimed at launch, not for candidates that never start). The race gives
+    up `timeout` seconds after its last launch; still-running attempts are
+    then reported as failed and closed if they answer late.
+
+    Returns (name, first_token, token_iterator) or None if every candidate failed.
+    """
+    results = queue.Queue()
+    race = _Race()
+    pending = list(candidates)
+    running = []
+
+    def launch():
+        while pending:
+            name, start_stream = pending.pop(0)
+            if acquire is None or acquire(name):
+                break
+        else:
+            return None
+
+        print(f"🤖 Trying model: {name}" + (" (hedge)" if running else ""))
+        attempt = _Attempt(name, start_stream, results, race)
+        attempt.thread.start()
+        running.append(attempt)
+        return hedge_delay(name)
+
+    delay = launch()
+
+    while running:
+        try:
+            attempt, first, tokens, error = results.get(timeout=delay if pending else (timeout or None))
+        except queue.Empty:
+            if pending:
+                delay = launch()
+                continue
+
+            # Nobody produced a token in time; late finishers lose the race and close.
+            race.claim(race)
+            for attempt in running:
+                on_failure(attempt.name, TimeoutError(f"no first token within {timeout:g}s"))
+            return None
+
+        running.remove(attempt)
+
+        if error is None:
+            return attempt.name, first, tokens
+
+        on_failure(attempt.name, error)
+        if pending:
+            delay = launch()
+
+    return None
+
+
+def first_token_within(start_stream, timeout=FIRST_TOKEN_TIMEOUT):
+    """
+    (first_token, token_iterator) from `start_stream()`, pulled on a worker
+    thread so a provider that hangs without raising cannot block the caller.
+    Raises the stream's error, or TimeoutError after `timeout` seconds
+    (0 = no limit); a stream that answers after that is closed.
+    """
+    results = queue.Queue()
+    race = _Race()
+
+    def pull():
+        try:
+            tokens = start_stream()
+            first = next(tokens, "")
+        except Exception as e:
+            if race.claim(pull):
+                results.put((None, None, e))
+            return
+
+        if not race.claim(pull):
+            tokens.close()
+            return
+        results.put((first, tokens, None))
+
+    threading.Thread(target=contextvars.copy_context().run, args=(pull,), name="first-token", daemon=True).start()
+
+    try:
+        first, tokens, error = results.get(timeout=timeout or None)
+    except queue.Empty:
+        if race.claim(race):
+            raise TimeoutError(f"no first token within {timeout:g}s")
+        first, tokens, error = results.get()
+
+    if error is not None:
+        raise error
+    return first, tokens
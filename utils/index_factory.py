@@ -0,0 +1,266 @@
+import math
+import os
+import time
+
+import faiss
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+# --------------------------------------------------
+# ⚙️ CONFIG
+# --------------------------------------------------
+# INDEX_TYPE: flat (exact, default) | hnsw | ivf_flat | ivf_pq
+#             | sq_fp16 / sq8 (scalar-quantised flat storage: 2× / 4× smaller)
+
+INDEX_TYPE = os.getenv("INDEX_TYPE", "flat").lower()
+
+# Below this many vectors an ANN index is not worth it and flat is kept.
+ANN_MIN_VECTORS = int(os.getenv("ANN_MIN_VECTORS", "10000"))
+ANN_TRAIN_SAMPLE = int(os.getenv("ANN_TRAIN_SAMPLE", "100000"))
+
+HNSW_M = int(os.getenv("HNSW_M", "32"))
+HNSW_EF_CONSTRUCTION = int(os.getenv("HNSW_EF_CONSTRUCTION", "200"))
+HNSW_EF_SEARCH = int(os.getenv("HNSW_EF_SEARCH", "64"))
+
+# 0 = derive from corpus size (≈ 4·√n lists).
+IVF_NLIST = int(os.getenv("IVF_NLIST", "0"))
+IVF_NPROBE = int(os.getenv("IVF_NPROBE", "16"))
+
+# Bytes per vector for IVF-PQ; 0 = dim / 8 (32× smaller than float32).
+PQ_M = int(os.getenv("PQ_M", "0"))
+
+INDEX_TYPES = ("flat", "hnsw", "ivf_flat", "ivf_pq", "sq_fp16", "sq8")
+
+# Storage-only compression: worth applying at any corpus size.
+QUANTIZED_TYPES = ("sq_fp16", "sq8")
+
+
+# --------------------------------------------------
+# 📏 REDUCED-DIMENSION (MATRYOSHKA) VECTORS
+# --------------------------------------------------
+
+def truncate_vectors(vectors, dim):
+    """Keep the first `dim` components and re-normalise (no-op when dim is 0 / full width)."""
+    arr = np.asarray(vectors, dtype=np.float32)
+
+    if dim and dim < arr.shape[-1]:
+        arr = arr[..., :dim]
+        norms = np.linalg.norm(arr, axis=-1, keepdims=True)
+        arr = arr / np.where(norms == 0, 1.0, norms)
+
+    return arr
+
+
+# --------------------------------------------------
+# 🏭 INDEX FACTORY
+# --------------------------------------------------
+
+def _nlist_for(n):
+    if IVF_NLIST:
+        return IVF_NLIST
+    # Keep ≥ 39 training points per centroid, as FAISS recommends.
+    return max(1, min(int(4 * math.sqrt(n)), n // 39))
+
+
+def _pq_m_for(dim):
+    target = PQ_M or max(1, dim // 8)
+    # PQ needs the sub-quantizer count to divide the dimension.
+    for m in range(min(target, dim), 0, -1):
+        if dim % m == 0:
+            return m
+    return 1
+
+
+def create_index(dim, n, index_type=None):
+    """Untrained, empty L2 index of the requested type for ~n vectors of size dim."""
+    index_type = (index_type or INDEX_TYPE).lower()
+
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown INDEX_TYPE '{index_type}'. Use one of: {', '.join(INDEX_TYPES)}")
+
+    if index_type == "flat":
+        return faiss.IndexFlatL2(dim)
+
+    if index_type == "sq_fp16":
+        return faiss.IndexScalarQuantizer(dim, faiss.ScalarQuantizer.QT_fp16)
+
+    if index_type == "sq8":
+        return faiss.IndexScalarQuantizer(dim, faiss.ScalarQuantizer.QT_8bit)
+
+    if index_type == "hnsw":
+        index = faiss.IndexHNSWFlat(dim, HNSW_M)
+        index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+        return index
+
+    quantizer = faiss.IndexFlatL2(dim)
+    nlist = _nlist_for(n)
+
+    if index_type == "ivf_flat":
+        return faiss.IndexIVFFlat(quantizer, dim, nlist)
+
+    return faiss.IndexIVFPQ(quantizer, dim, nlist, _pq_m_for(dim), 8)
+
+
+def configure_search(index, nprobe=None, ef_search=None):
+    """Apply query-time knobs (nprobe for IVF, efSearch for HNSW); no-op for flat."""
+    if isinstance(index, faiss.IndexHNSW):
+        index.hnsw.efSearch = ef_search or HNSW_EF_SEARCH
+        return index
+
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        ivf.nprobe = min(nprobe or IVF_NPROBE, ivf.nlist)
+
+    return index
+
+
+def is_lossy(index):
+    """True when stored codes are an approximation of the original vectors."""
+    if isinstance(index, (faiss.IndexScalarQuantizer, faiss.IndexIVFPQ, faiss.IndexPQ)):
+        return True
+    return isinstance(faiss.try_extract_index_ivf(index), faiss.IndexIVFPQ)
+
+
+def supports_removal(index):
+    """
+    Whether stale vectors can be deleted in place. HNSW graphs cannot drop
+    vectors, and IVF lists keep the surviving vectors' original labels while
+    LangChain renumbers its id map to 0..n-1; both are rebuilt instead.
+    """
+    if isinstance(index, faiss.IndexHNSW):
+        return False
+    return faiss.try_extract_index_ivf(index) is None
+
+
+def index_memory_bytes(index):
+    """Approximate resident size of an index's vector data."""
+    n = index.ntotal
+    dim = index.d
+
+    if isinstance(index, faiss.IndexHNSW):
+        return n * (dim * 4 + index.hnsw.nb_neighbors(0) * 4)
+
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        # Codes + stored ids, plus centroids.
+        return n * (ivf.code_size + 8) + ivf.nlist * dim * 4
+
+    if isinstance(index, faiss.IndexScalarQuantizer):
+        return n * index.code_size
+
+    return n * dim * 4
+
+
+# --------------------------------------------------
+# 🔁 FLAT → ANN CONVERSION
+# --------------------------------------------------
+
+def build_ann_index(flat_index, index_type=None):
+    """
+    Rebuild a populated flat index as the configured ANN type.
+
+    Vectors are read back from the exact index, a random sample trains the
+    IVF quantizers, and positions are preserved so the docstore id map stays
+    valid. Returns (index, recall/latency report or None).
+    """
+    index_type = (index_type or INDEX_TYPE).lower()
+    n = flat_index.ntotal
+
+    if index_type == "flat":
+        return flat_index, None
+
+    if index_type not in QUANTIZED_TYPES and n < ANN_MIN_VECTORS:
+        return flat_index, None
+
+    vectors = flat_index.reconstruct_n(0, n)
+    index = create_index(flat_index.d, n, index_type)
+
+    if not index.is_trained:
+        rng = np.random.default_rng(0)
+        sample = vectors[rng.choice(n, size=min(n, ANN_TRAIN_SAMPLE), replace=False)]
+        print(f"🎓 Training {index_type} index on {len(sample)} vectors")
+        index.train(sample)
+
+    index.add(vectors)
+    configure_search(index)
+
+    report = evaluate_index(index, flat_index, vectors)
+    report["index_type"] = index_type
+    print(f"📐 Index report: {report}")
+
+    return index, report
+
+
+# --------------------------------------------------
+# 📊 RECALL vs LATENCY
+# --------------------------------------------------
+
+def evaluate_index(index, exact_index, vectors, k=4, n_queries=200):
+    """
+    Recall@k of `index` against the exact baseline plus per-query latency of
+    both, using a sample of stored vectors as queries.
+    """
+    rng = np.random.default_rng(1)
+    queries = vectors[rng.choice(len(vectors), size=min(n_queries, len(vectors)), replace=False)]
+
+    start = time.perf_counter()
+    _, exact_ids = exact_index.search(queries, k)
+    exact_ms = (time.perf_counter() - start) * 1000 / len(queries)
+
+    start = time.perf_counter()
+    _, ann_ids = index.search(queries, k)
+    ann_ms = (time.perf_counter() - start) * 1000 / len(queries)
+
+    hits = sum(
+        len(set(found) & set(expected))
+        for found, expected in zip(ann_ids.tolist(), exact_ids.tolist())
+    )
+
+    return {
+        f"recall@{k}": round(hits / (len(queries) * k), 4),
+        "flat_ms_per_query": round(exact_ms, 4),
+        "ann_ms_per_query": round(ann_ms, 4),
+        "flat_bytes": index_memory_bytes(exact_index),
+        "ann_bytes": index_memory_bytes(index),
+    }
+
+
+def evaluate_compression(full_vectors, dim, index_type=None, k=4, n_queries=200):
+    """
+    Recall@k of the stored representation (truncated to `dim`, then encoded
+    as `index_type`) against exact search over full-precision vectors.
+    Run on a sample of cached originals to measure what compression costs.
+    """
+    full_vectors = np.asarray(full_vectors, dtype=np.float32)
+    n = len(full_vectors)
+
+    exact = faiss.IndexFlatL2(full_vectors.shape[1])
+    exact.add(full_vectors)
+
+    reduced = truncate_vectors(full_vectors, dim)
+    index = create_index(reduced.shape[1], n, index_type)
+    if not index.is_trained:
+        index.train(reduced)
+    index.add(reduced)
+    configure_search(index)
+
+    rng = np.random.default_rng(2)
+    picks = rng.choice(n, size=min(n_queries, n), replace=False)
+    _, exact_ids = exact.search(full_vectors[picks], k)
+    _, found_ids = index.search(reduced[picks], k)
+
+    hits = sum(
+        len(set(found) & set(expected))
+        for found, expected in zip(found_ids.tolist(), exact_ids.tolist())
+    )
+
+    return {
+        f"recall@{k}": round(hits / (len(picks) * k), 4),
+        "dim": reduced.shape[1],
+        "index_type": (index_type or INDEX_TYPE).lower(),
+        "bytes_per_vector": index_memory_bytes(index) // max(1, n),
+        "full_bytes_per_vector": full_vectors.shape[1] * 4,
+    }
@@ -0,0 +1,127 @@
+import os
+import shutil
+import time
+import uuid
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+CURRENT_FILE = "CURRENT"
+VERSION_PREFIX = "v-"
+
+# How often a waiting process retries the build lock.
+LOCK_POLL_SECONDS = 0.2
+
+
+# --------------------------------------------------
+# 🗂️ VERSIONED INDEX DIRECTORIES
+# --------------------------------------------------
+# Every build writes a complete new version directory under the persist dir
+# (FAISS index, docstore, keyword index, manifest) and then flips the CURRENT
+# pointer to it. Files a running process has open or memory-mapped are never
+# renamed over or rewritten, which Windows refuses with a sharing violation.
+
+def current_dir(persist_dir):
+    """Directory of the published index (the persist dir itself for the older flat layout)."""
+    try:
+        with open(os.path.join(persist_dir, CURRENT_FILE), "r", encoding="utf-8") as f:
+            name = f.read().strip()
+    except FileNotFoundError:
+        return persist_dir
+
+    return os.path.join(persist_dir, name) if name else persist_dir
+
+
+def new_version_dir(persist_dir):
+    """A fresh, unpublished version directory to build into."""
+    path = os.path.join(persist_dir, f"{VERSION_PREFIX}{uuid.uuid4().hex[:12]}")
+    os.makedirs(path)
+    return path
+
+
+def publish_version(persist_dir, version_dir):
+    """Point CURRENT at `version_dir`; the pointer file is small and never held open."""
+    path = os.path.join(persist_dir, CURRENT_FILE)
+    tmp_path = f"{path}.tmp"
+
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(os.path.basename(version_dir))
+
+    os.replace(tmp_path, path)
+
+
+def prune_versions(persist_dir, legacy_files=()):
+    """
+    Best-effort removal of superseded version dirs and of `legacy_files`
+    left in the persist dir root by the flat layout. Anything still open
+    elsewhere (on Windows) is left for a later build to remove.
+    """
+    current = current_dir(persist_dir)
+    published = current != persist_dir
+
+    for name in os.listdir(persist_dir):
+        path = os.path.join(persist_dir, name)
+
+        if name.startswith(VERSION_PREFIX) and path != current:
+            shutil.rmtree(path, ignore_errors=True)
+        elif published and name in legacy_files:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+# --------------------------------------------------
+# 🔒 BUILD LOCK (ACROSS PROCESSES)
+# --------------------------------------------------
+# The UI and the API can run side by side on the same upload folder and
+# persist dir. Builds, upload writes and resets hold this lock so one
+# process never prunes a version another is still writing. The lock file
+# sits next to the persist dir, so deleting the dir never touches it.
+
+def _try_lock(fd):
+    try:
+        if fcntl is not None:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+    except OSError:
+        return False
+    return True
+
+
+def _unlock(fd):
+    if fcntl is not None:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+    else:
+        os.lseek(fd, 0, os.SEEK_SET)
+        msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+
+
+@contextmanager
+def persist_lock(persist_dir, timeout=None):
+    """
+    Hold the build lock for `persist_dir`, waiting up to `timeout` seconds
+    (forever when None). Raises TimeoutError if another holder keeps it.
+    """
+    path = f"{os.path.abspath(persist_dir)}.lock"
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    fd = os.open(path, os.O_RDWR | os.O_CREAT)
+    try:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not _try_lock(fd):
+            if deadline is not None and time.monotonic() >= deadline:
+                raise TimeoutError(f"{persist_dir} is locked by another indexing run")
+            time.sleep(LOCK_POLL_SECONDS)
+
+        try:
+            yield
+        finally:
+            _unlock(fd)
+    finally:
+        os.close(fd)
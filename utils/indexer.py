@@ -0,0 +1,520 @@
+import hashlib
+import json
+import os
+import random
+import shutil
+import time
+import uuid
+from contextlib import contextmanager
+
+from dotenv import load_dotenv
+
+from utils.embedding_pipeline import EMBED_BATCH_SIZE, EMBED_MAX_WORKERS
+from utils.docstore import DOCSTORE_FILE, SQLiteDocstore
+from utils.embeddings import (
+    add_to_vectorstore,
+    build_vectorstore,
+    load_vectorstore,
+    save_vectorstore,
+    vectorstore_exists,
+    EMBEDDING_DIM,
+    INDEX_FILE,
+    VECTORSTORE_MMAP,
+)
+from utils.hash_utils import build_manifest, diff_manifests, scan_folder
+from utils.bm25 import BM25Index, KEYWORD_FILE, keyword_index_path
+from utils.embedding_cache import chunk_key
+from utils.index_factory import (
+    INDEX_TYPE,
+    QUANTIZED_TYPES,
+    build_ann_index,
+    evaluate_compression,
+    index_memory_bytes,
+    supports_removal,
+)
+from utils.index_versions import current_dir, new_version_dir, persist_lock, prune_versions, publish_version
+from utils.loader import iter_file_documents
+from utils.resources import get_embedding_cache, get_vectorstore
+from utils.splitter import iter_split_documents
+from utils.tracing import metrics, span
+
+load_dotenv()
+
+MANIFEST_FILE = "manifest.json"
+
+# Files the flat (pre-versioning) layout kept in the persist dir root.
+LEGACY_FILES = (INDEX_FILE, DOCSTORE_FILE, KEYWORD_FILE, MANIFEST_FILE)
+
+# Chunks buffered before each embed + index insert; sized to keep the embedding pool busy.
+INDEX_BATCH_SIZE = int(os.getenv("INDEX_BATCH_SIZE", str(EMBED_BATCH_SIZE * EMBED_MAX_WORKERS)))
+
+
+# --------------------------------------------------
+# 📒 MANIFEST
+# --------------------------------------------------
+# The manifest records, per indexed file, its content hash and the docstore
+# ids of its chunks so a later run can delete exactly those vectors.
+
+def read_manifest(persist_dir):
+    path = os.path.join(current_dir(persist_dir), MANIFEST_FILE)
+
+    if not os.path.exists(path):
+        return None
+
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def write_manifest(directory, manifest):
+    os.makedirs(directory, exist_ok=True)
+
+    path = os.path.join(directory, MANIFEST_FILE)
+    tmp_path = f"{path}.tmp"
+
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+
+    os.replace(tmp_path, path)
+
+
+def _index_settings():
+    """Index-shape settings recorded in the manifest; changing any forces a rebuild."""
+    return {"index_type": INDEX_TYPE, "dim": EMBEDDING_DIM}
+
+
+def _settings_match(manifest):
+    return (
+        manifest.get("index_type", "flat") == INDEX_TYPE
+        and manifest.get("dim", 0) == EMBEDDING_DIM
+    )
+
+
+def _compression_report(db, model_name, sample_size=2000):
+    """
+    Measure recall lost to truncation/quantisation on a sample of chunks,
+    using their full-precision vectors from the embedding cache.
+    """
+    if not (EMBEDDING_DIM or INDEX_TYPE in QUANTIZED_TYPES or INDEX_TYPE == "ivf_pq"):
+        return None
+
+    try:
+        ids = list(db.index_to_docstore_id.values())
+        random.Random(0).shuffle(ids)
+
+        keys = [chunk_key(db.docstore.search(_id).page_content, model_name) for _id in ids[:sample_size]]
+        vectors = list(get_embedding_cache().get_many(keys).values())
+
+        report = evaluate_compression(vectors, EMBEDDING_DIM, INDEX_TYPE)
+        print(f"📉 Compression report: {report}")
+        return report
+    except Exception as e:
+        # Too few vectors to train a quantizer on the sample, etc.
+        print(f"ℹ️ Compression report unavailable: {e}")
+        return None
+
+
+def index_fingerprint(manifest):
+    """Stable id of an index's content: embedding model + every file's name and hash."""
+    hasher = hashlib.sha256(
+        f"{manifest['model']}\0{manifest.get('index_type', 'flat')}\0{manifest.get('dim', 0)}".encode("utf-8")
+    )
+
+    for name, entry in sorted(manifest["files"].items()):
+        hasher.update(f"\0{name}\0{entry['hash']}".encode("utf-8"))
+
+    return hasher.hexdigest()
+
+
+def _summarize(manifest, added=(), changed=(), removed=()):
+    files = manifest["files"]
+    return {
+        "fingerprint": index_fingerprint(manifest),
+        "replaces": None,
+        "index_report": None,
+        "compression_report": None,
+        "files": len(files),
+        "pages": sum(entry["pages"] for entry in files.values()),
+        "chunks": sum(len(entry["ids"]) for entry in files.values()),
+        "added": list(added),
+        "changed": list(changed),
+        "removed": list(removed),
+    }
+
+
+# --------------------------------------------------
+# 🗂️ VERSIONED WRITES
+# --------------------------------------------------
+# A build never touches the published files: it writes a whole new version
+# dir, and readers switch only when the CURRENT pointer flips to it.
+
+@contextmanager
+def _new_version(persist_dir):
+    """Yield a fresh version dir; publish it on success, discard it on failure."""
+    os.makedirs(persist_dir, exist_ok=True)
+    version_dir = new_version_dir(persist_dir)
+
+    try:
+        yield version_dir
+    except BaseException:
+        shutil.rmtree(version_dir, ignore_errors=True)
+        raise
+
+    publish_version(persist_dir, version_dir)
+    prune_versions(persist_dir, legacy_files=LEGACY_FILES)
+
+
+@contextmanager
+def _keyword_writer(persist_dir, version_dir, fresh=False):
+    """
+    Yield a writable BM25 index in `version_dir`, starting from a copy of the
+    published one unless `fresh`; it becomes visible with the version.
+    """
+    path = os.path.join(version_dir, KEYWORD_FILE)
+
+    if not fresh:
+        shutil.copyfile(keyword_index_path(persist_dir), path)
+
+    keyword_index = BM25Index(path)
+    try:
+        yield keyword_index
+    finally:
+        keyword_index.close()
+
+
+@contextmanager
+def _docstore_writer(version_dir, source=None):
+    """
+    Yield a write-through docstore in `version_dir`, starting from a copy of
+    `source` (the loaded index's docstore) when given, so chunk text reaches
+    disk batch by batch instead of piling up until the save.
+    """
+    path = os.path.join(version_dir, DOCSTORE_FILE)
+    docstore = source.copy_to(path) if source is not None else SQLiteDocstore(path, write_through=True)
+    try:
+        yield docstore
+    finally:
+        docstore.close()
+
+
+# --------------------------------------------------
+# 🌊 STREAMING LOAD → SPLIT → EMBED
+# --------------------------------------------------
+
+def _stream_into_index(
+    folder,
+    filenames,
+    scanned,
+    model_name,
+    db=None,
+    docstore=None,
+    keyword_index=None,
+    on_progress=None,
+    on_batch=None,
+):
+    """
+    Stream pages → chunks → fixed-size embedding batches into `db` (and the
+    BM25 `keyword_index`, kept in step chunk id by chunk id).
+
+    A new index is created from the first batch when `db` is None; its
+    chunks then move into `docstore` (a write-through SQLite store), which
+    receives every later batch. Chunk text therefore reaches disk per batch:
+    what grows with the corpus is the vectors and the id map, not the text.
+    Embedding starts while later files are still being extracted.
+    `on_batch(chunks_indexed)` runs after every flushed batch. `scanned` is the folder's `scan_folder` result (hash, size, mtime
+    per file). Returns (db, manifest entries).
+    """
+    entries = {
+        filename: {**scanned[filename], "pages": 0, "ids": []}
+        for filename in filenames
+    }
+    paths = [os.path.join(folder, filename) for filename in filenames]
+    names = dict(zip(paths, filenames))
+
+    batch_chunks = []
+    batch_ids = []
+    indexed = 0
+
+    def flush():
+        nonlocal db, indexed
+        if not batch_chunks:
+            return
+        with span("index_batch", chunks=len(batch_chunks)):
+            if db is None:
+                db = build_vectorstore(batch_chunks, model_name, ids=batch_ids)
+                if docstore is not None:
+                    docstore.add(db.docstore._dict)
+                    db.docstore = docstore
+            else:
+                add_to_vectorstore(db, batch_chunks, ids=batch_ids, model_name=model_name)
+            if keyword_index is not None:
+                with span("keyword_index_add"):
+                    keyword_index.add(batch_ids, [chunk.page_content for chunk in batch_chunks])
+        metrics.incr("rag_indexed_chunks_total", len(batch_chunks))
+        indexed += len(batch_chunks)
+        batch_chunks.clear()
+        batch_ids.clear()
+        if on_batch is not None:
+            on_batch(indexed)
+
+    files = iter_file_documents(paths, on_progress=on_progress)
+
+    while True:
+        # Load time is what the build waits on extraction; the pool keeps reading ahead meanwhile.
+        started = time.monotonic()
+        item = next(files, None)
+        if item is None:
+            break
+        metrics.observe("rag_stage_seconds", time.monotonic() - started, stage="load")
+
+        path, docs = item
+        entry = entries[names[path]]
+        entry["pages"] += len(docs)
+
+        with span("split", file=names[path], pages=len(docs)) as split_span:
+            chunks = list(iter_split_documents(docs))
+            split_span.set(chunks=len(chunks))
+
+        for chunk in chunks:
+            chunk_id = str(uuid.uuid4())
+            entry["ids"].append(chunk_id)
+            batch_chunks.append(chunk)
+            batch_ids.append(chunk_id)
+
+            if len(batch_chunks) >= INDEX_BATCH_SIZE:
+                flush()
+
+    flush()
+
+    return db, entries
+
+
+# --------------------------------------------------
+# 🏗️ INDEX FOLDER (FULL OR INCREMENTAL)
+# --------------------------------------------------
+
+def index_folder(
+    folder,
+    persist_dir,
+    model_name="gemini-embedding-001",
+    incremental=True,
+    on_progress=None,
+    on_batch=None,
+):
+    """
+    Bring the vectorstore in `persist_dir` in line with the files in `folder`.
+
+    In incremental mode only added/changed files are loaded and embedded and
+    chunks of changed/removed files are deleted by docstore id. A full rebuild
+    happens when there is no usable previous index or the embedding model changed.
+
+    `on_progress(path, files_done, files_total)` reports per-file loading progress
+    and `on_batch(chunks_indexed)` embedding progress; either may raise to abort.
+    Files on disk are only replaced once the new index is complete, so an
+    aborted or failed run leaves the previous index intact. A build running
+    in another process (UI and API side by side) is waited for.
+
+    Returns (vectorstore, summary dict).
+    """
+    indexed_before = metrics.counter("rag_indexed_chunks_total")
+
+    with persist_lock(persist_dir), span("index_folder", incremental=incremental) as build:
+        db, summary = _sync_index(folder, persist_dir, model_name, incremental, on_progress, on_batch)
+        build.set(files=summary["files"], chunks=summary["chunks"])
+
+    _record_build(db, indexed_before, build.seconds)
+    return db, summary
+
+
+def _record_build(db, indexed_before, seconds):
+    """Gauges describing the latest build and the index now being served."""
+    indexed = metrics.counter("rag_indexed_chunks_total") - indexed_before
+
+    metrics.set_gauge("rag_last_build_seconds", round(seconds, 3))
+    metrics.set_gauge("rag_last_build_chunks", indexed)
+    if indexed and seconds > 0:
+        metrics.set_gauge("rag_last_build_chunks_per_second", round(indexed / seconds, 1))
+
+    metrics.set_gauge("rag_index_vectors", db.index.ntotal)
+    metrics.set_gauge("rag_index_memory_bytes", index_memory_bytes(db.index))
+
+
+def _reload(persist_dir, model_name):
+    """
+    Reopen the just-published version from disk. The built copy holds every
+    chunk's text in memory (InMemoryDocstore or buffered adds); the reloaded
+    one reads chunks lazily from SQLite, like a warm start.
+    """
+    return load_vectorstore(persist_dir, model_name, mmap=VECTORSTORE_MMAP)
+
+
+def _sync_index(folder, persist_dir, model_name, incremental, on_progress, on_batch):
+    previous = read_manifest(persist_dir) if incremental else None
+
+    # Files whose size and mtime match the manifest are not re-hashed.
+    scanned = scan_folder(folder, known=previous["files"] if previous else None)
+    current = {name: entry["hash"] for name, entry in scanned.items()}
+
+    if not current:
+        raise ValueError("No documents were loaded. Please upload valid PDF or TXT files.")
+
+    can_update = (
+        previous is not None
+        and previous.get("model") == model_name
+        and _settings_match(previous)
+        and vectorstore_exists(persist_dir)
+        and os.path.exists(keyword_index_path(persist_dir))
+    )
+
+    if not can_update:
+        print("🏗️ Full index rebuild")
+
+        # The old version stays published (and keeps serving) until the new
+        # one is complete.
+        stale = read_manifest(persist_dir)
+
+        with _new_version(persist_dir) as version_dir:
+            with _keyword_writer(persist_dir, version_dir, fresh=True) as keyword_index, \
+                    _docstore_writer(version_dir) as docstore:
+                db, entries = _stream_into_index(
+                    folder,
+                    list(current),
+                    scanned,
+                    model_name,
+                    docstore=docstore,
+                    keyword_index=keyword_index,
+                    on_progress=on_progress,
+                    on_batch=on_batch,
+                )
+
+                if db is None:
+                    raise ValueError("No readable text was found to index. Try text-based files (not image-only PDFs).")
+
+                # Streaming builds an exact index; swap in the configured ANN type at the end.
+                with span("build_ann_index"):
+                    db.index, index_report = build_ann_index(db.index)
+
+                with span("save_vectorstore"):
+                    save_vectorstore(db, version_dir)
+
+            manifest = {"model": model_name, **_index_settings(), "files": entries}
+            write_manifest(version_dir, manifest)
+
+        db = _reload(persist_dir, model_name)
+
+        summary = _summarize(manifest, added=list(current))
+        summary["replaces"] = index_fingerprint(stale) if stale else None
+        summary["index_report"] = index_report
+        summary["compression_report"] = _compression_report(db, model_name)
+        return db, summary
+
+    previous_hashes = {name: entry["hash"] for name, entry in previous["files"].items()}
+    added, changed, removed = diff_manifests(previous_hashes, current)
+
+    print(f"♻️ Incremental update: +{len(added)} ~{len(changed)} -{len(removed)}")
+
+    if not (added or changed or removed):
+        # Nothing to do: reuse the process-wide copy of this index if one is loaded.
+        fingerprint = index_fingerprint(previous)
+        db = get_vectorstore(fingerprint, lambda: load_vectorstore(persist_dir, model_name))
+        return db, _summarize(previous)
+
+    # Updates always start from the on-disk copy so the shared index other
+    # sessions are reading is never mutated in place.
+    db = load_vectorstore(persist_dir, model_name)
+    files = dict(previous["files"])
+
+    stale_ids = [
+        chunk_id
+        for name in (*changed, *removed)
+        for chunk_id in files[name]["ids"]
+    ]
+
+    if stale_ids and not supports_removal(db.index):
+        print(f"ℹ️ {type(db.index).__name__} cannot delete vectors in place; rebuilding instead")
+        return _sync_index(folder, persist_dir, model_name, False, on_progress, on_batch)
+
+    for name in (*changed, *removed):
+        files.pop(name, None)
+
+    with _new_version(persist_dir) as version_dir:
+        with _keyword_writer(persist_dir, version_dir) as keyword_index, \
+                _docstore_writer(version_dir, db.docstore) as docstore:
+            db.docstore = docstore
+
+            if stale_ids:
+                db.delete(stale_ids)
+                keyword_index.delete(stale_ids)
+
+            db, entries = _stream_into_index(
+                folder,
+                [*added, *changed],
+                scanned,
+                model_name,
+                db=db,
+                keyword_index=keyword_index,
+                on_progress=on_progress,
+                on_batch=on_batch,
+            )
+            files.update(entries)
+
+            if db.index.ntotal == 0:
+                raise ValueError("No readable text was found to index. Try text-based files (not image-only PDFs).")
+
+            save_vectorstore(db, version_dir)
+
+        # Keep manifest order aligned with the folder listing; refresh the
+        # size/mtime of unchanged files so they are not re-hashed next time.
+        manifest = {
+            "model": model_name,
+            **_index_settings(),
+            "files": {name: {**files[name], **scanned[name]} for name in current},
+        }
+        write_manifest(version_dir, manifest)
+
+    db = _reload(persist_dir, model_name)
+
+    summary = _summarize(manifest, added, changed, removed)
+    summary["replaces"] = index_fingerprint(previous)
+    return db, summary
+
+
+# --------------------------------------------------
+# 🔥 WARM START
+# --------------------------------------------------
+
+def attach_persisted_index(folder, persist_dir, model_name="gemini-embedding-001", mmap=None):
+    """
+    Reattach the index persisted by a previous process, if it still matches.
+
+    The stored manifest must name the same embedding model and list exactly the
+    files (by content hash) currently in `folder`; only files whose size or
+    mtime changed since the build are re-hashed. Returns (db, summary) or
+    (None, None) when there is nothing valid to attach.
+    """
+    previous = read_manifest(persist_dir)
+
+    if previous is None or previous.get("model") != model_name:
+        return None, None
+
+    if not _settings_match(previous):
+        return None, None
+
+    if not (os.path.isdir(folder) and vectorstore_exists(persist_dir)):
+        return None, None
+
+    # Only files whose size or mtime changed since the build are re-hashed.
+    previous_hashes = {name: entry["hash"] for name, entry in previous["files"].items()}
+    if build_manifest(folder, known=previous["files"]) != previous_hashes:
+        print("ℹ️ Persisted index does not match uploaded files; skipping warm start")
+        return None, None
+
+    mmap = VECTORSTORE_MMAP if mmap is None else mmap
+    summary = _summarize(previous)
+
+    db = get_vectorstore(
+        summary["fingerprint"],
+        lambda: load_vectorstore(persist_dir, model_name, mmap=mmap),
+    )
+    print(f"🔥 Warm start: attached persisted index ({summary['chunks']} chunks)")
+
+    return db, summary
@@ -0,0 +1,209 @@
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.indexer import index_folder
+from utils.resources import register_vectorstore
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+FINISHED = (SUCCEEDED, FAILED, CANCELLED)
+
+# Finished jobs kept in the table for late pollers.
+MAX_FINISHED_JOBS = 50
+
+
+class IndexingCancelled(Exception):
+    """Raised from a progress callback to abort an indexing job."""
+
+
+# --------------------------------------------------
+# 📋 JOB RECORD
+# --------------------------------------------------
+
+class IndexJob:
+    """One background indexing run and its progress, as shown to pollers."""
+
+    def __init__(self, folder, persist_dir, incremental=True):
+        self.id = uuid.uuid4().hex[:12]
+        self.folder = folder
+        self.persist_dir = persist_dir
+        self.incremental = incremental
+
+        self.status = QUEUED
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+
+        self.files_total = 0
+        self.files_done = 0
+        self.current_file = None
+        self.chunks_indexed = 0
+
+        self.summary = None
+        self.error = None
+        self._cancel = threading.Event()
+        self._done = threading.Event()
+
+    @property
+    def finished(self):
+        return self.status in FINISHED
+
+    @property
+    def cancel_requested(self):
+        return self._cancel.is_set()
+
+    def wait(self, timeout=None):
+        """Block until the job has stopped touching its folders; False on timeout."""
+        return self._done.wait(timeout)
+
+    def progress(self):
+        """0..1, from files loaded (embedding trails loading by at most one batch)."""
+        if self.status == SUCCEEDED:
+            return 1.0
+        if not self.files_total:
+            return 0.0
+        return self.files_done / self.files_total
+
+    def eta_seconds(self):
+        progress = self.progress()
+        if self.status != RUNNING or not self.started_at or progress <= 0:
+            return None
+        elapsed = time.time() - self.started_at
+        return elapsed * (1 - progress) / progress
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "status": self.status,
+            "incremental": self.incremental,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "files_total": self.files_total,
+            "files_done": self.files_done,
+            "current_file": self.current_file,
+            "chunks_indexed": self.chunks_indexed,
+            "progress": round(self.progress(), 3),
+            "eta_seconds": self.eta_seconds(),
+            "summary": self.summary,
+            "error": self.error,
+        }
+
+
+# --------------------------------------------------
+# 🧵 JOB MANAGER
+# --------------------------------------------------
+
+class JobManager:
+    """
+    Process-wide job table for background indexing.
+
+    Jobs run one at a time on a worker thread, since they all write the same
+    persist dir. Nothing is published until a job finishes: the new index is
+    written beside the old files and swapped in atomically, then registered
+    for sessions, so questions keep hitting the previous index meanwhile.
+    """
+
+    def __init__(self):
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="index-job")
+
+    def submit(self, folder, persist_dir, incremental=True):
+        job = IndexJob(folder, persist_dir, incremental)
+
+        with self._lock:
+            self._jobs[job.id] = job
+            self._prune()
+
+        self._executor.submit(self._run, job)
+        print(f"📥 Queued indexing job {job.id}")
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def jobs(self):
+        with self._lock:
+            return sorted(self._jobs.values(), key=lambda job: job.created_at, reverse=True)
+
+    def active(self):
+        """The queued or running job, if any (newest first)."""
+        return next((job for job in self.jobs() if not job.finished), None)
+
+    def cancel(self, job_id):
+        job = self.get(job_id)
+        if job is None or job.finished:
+            return False
+
+        job._cancel.set()
+        if job.status == QUEUED:
+            job.status = CANCELLED
+            job.finished_at = time.time()
+            job._done.set()
+        return True
+
+    def _prune(self):
+        finished = sorted(
+            (job for job in self._jobs.values() if job.finished),
+            key=lambda job: job.created_at,
+        )
+        for job in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+            del self._jobs[job.id]
+
+    def _run(self, job):
+        if job.cancel_requested:
+            job._done.set()
+            return
+
+        job.status = RUNNING
+        job.started_at = time.time()
+
+        def on_progress(path, files_done, files_total):
+            if job.cancel_requested:
+                raise IndexingCancelled()
+            job.current_file = os.path.basename(path)
+            job.files_done = files_done
+            job.files_total = files_total
+
+        def on_batch(chunks_indexed):
+            if job.cancel_requested:
+                raise IndexingCancelled()
+            job.chunks_indexed = chunks_indexed
+
+        try:
+            db, summary = index_folder(
+                job.folder,
+                job.persist_dir,
+                incremental=job.incremental,
+                on_progress=on_progress,
+                on_batch=on_batch,
+            )
+            register_vectorstore(summary["fingerprint"], db, replaces=summary["replaces"])
+            job.summary = summary
+            job.status = SUCCEEDED
+            print(f"✅ Indexing job {job.id} finished")
+
+        except IndexingCancelled:
+            job.status = CANCELLED
+            print(f"🛑 Indexing job {job.id} cancelled")
+
+        except Exception as e:
+            job.error = str(e)
+            job.status = FAILED
+            print(f"⚠️ Indexing job {job.id} failed: {e}")
+
+        finally:
+            job.finished_at = time.time()
+            job._done.set()
+
+
+job_manager = JobManager()
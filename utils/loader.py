@@ -1,20 +1,132 @@
 import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+from dotenv import load_dotenv
 from langchain_community.document_loaders import PyPDFLoader, TextLoader
+from langchain_core.documents import Document
+from pypdf import PdfReader
 
-def load_documents(folder):
+load_dotenv()
 
-    documents = []
+LOADER_MAX_WORKERS = int(os.getenv("LOADER_MAX_WORKERS", str(os.cpu_count() or 1)))
+
+# PDFs longer than this are split into page ranges that load in parallel.
+PDF_PAGES_PER_TASK = int(os.getenv("PDF_PAGES_PER_TASK", "50"))
+
+
+def load_file(path):
+
+    filename = os.path.basename(path)
+
+    if filename.lower().endswith(".pdf"):
+        return PyPDFLoader(path).load()
+
+    if filename.lower().endswith(".txt"):
+        return TextLoader(path).load()
 
-    for filename in os.listdir(folder):
+    return []
 
-        path = os.path.join(folder, filename)
 
-        if filename.lower().endswith(".pdf"):
-            loader = PyPDFLoader(path)
-            documents.extend(loader.load())
+def load_pdf_pages(path, start, stop):
+    """Extract pages [start, stop) of a PDF with the same source/page metadata as PyPDFLoader."""
 
-        elif filename.lower().endswith(".txt"):
-            loader = TextLoader(path)
-            documents.extend(loader.load())
+    reader = PdfReader(path)
+    total_pages = len(reader.pages)
+    labels = reader.page_labels
+
+    documents = []
+    for page in range(start, min(stop, total_pages)):
+        documents.append(
+            Document(
+                page_content=reader.pages[page].extract_text() or "",
+                metadata={
+                    "source": path,
+                    "page": page,
+                    "total_pages": total_pages,
+                    "page_label": labels[page] if page < len(labels) else str(page + 1),
+                },
+            )
+        )
 
     return documents
+
+
+def _run_task(task):
+    path, start, stop = task
+    if start is None:
+        return load_file(path)
+    return load_pdf_pages(path, start, stop)
+
+
+def _plan_tasks(path):
+    """One task per file, or one per page range for large PDFs."""
+
+    if path.lower().endswith(".pdf"):
+        total_pages = len(PdfReader(path).pages)
+        if total_pages > PDF_PAGES_PER_TASK:
+            return [
+                (path, start, start + PDF_PAGES_PER_TASK)
+                for start in range(0, total_pages, PDF_PAGES_PER_TASK)
+            ]
+
+    return [(path, None, None)]
+
+
+def iter_file_documents(paths, on_progress=None, max_workers=None):
+    """
+    Stream documents for many files, loaded over a process pool.
+
+    Yields (path, documents) per load task (a whole file or a PDF page range)
+    strictly in the order of `paths`, so output is deterministic regardless of
+    which worker finishes first. Only a small window of tasks is in flight, so
+    memory stays bounded however large the corpus is.
+    `on_progress(path, files_done, files_total)` fires as each file completes.
+    """
+
+    max_workers = max_workers or LOADER_MAX_WORKERS
+    tasks = (
+        (index, task)
+        for index, path in enumerate(paths)
+        for task in _plan_tasks(path)
+    )
+
+    current = None
+    files_done = 0
+
+    def advance(index):
+        nonlocal current, files_done
+        if current is not None and index != current:
+            files_done += 1
+            if on_progress is not None:
+                on_progress(paths[current], files_done, len(paths))
+        current = index
+
+    if max_workers <= 1 or len(paths) == 0:
+        for index, task in tasks:
+            advance(index)
+            yield paths[index], _run_task(task)
+        advance(None)
+        return
+
+    pool = ProcessPoolExecutor(max_workers=max_workers)
+    pending = deque()
+
+    try:
+        for index, task in islice(tasks, max_workers * 2):
+            pending.append((index, pool.submit(_run_task, task)))
+
+        while pending:
+            index, future = pending.popleft()
+            documents = future.result()
+
+            for next_index, next_task in islice(tasks, 1):
+                pending.append((next_index, pool.submit(_run_task, next_task)))
+
+            advance(index)
+            yield paths[index], documents
+
+        advance(None)
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
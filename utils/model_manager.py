@@ -1,9 +1,15 @@
 import os
+import threading
+from collections import OrderedDict
+
 from dotenv import load_dotenv
 
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_openai import ChatOpenAI
 
+from utils.provider_health import CLOSED, HALF_OPEN, provider_health
+from utils.resources import get_llm_client, invalidate_llm_clients
+
 load_dotenv()
 
 
@@ -46,54 +52,203 @@ if openrouter_api_key and openrouter_model:
             }
         )
 
-_active_index = 0
-
+ROUTER_MAX_SESSIONS = int(os.getenv("ROUTER_MAX_SESSIONS", "1024"))
 
-# --------------------------------------------------
-# GET ACTIVE CONFIG
-# --------------------------------------------------
 
-def get_active_config():
-    return MODEL_POOL[_active_index]
+def config_name(cfg):
+    return f"{cfg['provider']}:{cfg.get('model', 'N/A')}"
 
 
 # --------------------------------------------------
-# ROTATE MODEL
+# MODEL ROUTER (SHARED HEALTH, PER-SESSION PREFERENCE)
 # --------------------------------------------------
 
-def rotate_model():
-    global _active_index
+class SessionRouter:
+    """
+    One session's (or tenant's) view of the router.
+
+    Each view keeps its own preferred provider, so a failover in one session
+    no longer switches the provider for everyone else. Provider health and
+    circuit breakers stay shared, because an outage affects every session.
+    """
+
+    def __init__(self, router):
+        self.router = router
+        self._active_index = 0
+        self._lock = threading.Lock()
+
+    @property
+    def active_index(self):
+        with self._lock:
+            return self._active_index
+
+    def active_config(self):
+        return self.router.active_config(self.active_index)
+
+    def route(self):
+        return self.router.route(self.active_index)
+
+    def acquire(self, cfg):
+        return self.router.acquire(cfg)
+
+    def rotate(self, failed_cfg=None):
+        """
+        Advance to the next pool entry. With `failed_cfg`, only rotate if it
+        is still the preferred entry, so concurrent failures of the same
+        provider rotate once instead of skipping past the next provider.
+        """
+        pool = self.router.pool
+
+        with self._lock:
+            if failed_cfg is not None and pool[self._active_index] is not failed_cfg:
+                return
+            self._active_index = (self._active_index + 1) % len(pool)
+            cfg = pool[self._active_index]
+
+        print(f"🔁 Switched to {cfg['provider']} → {cfg['model']}")
+
+    def reset(self):
+        with self._lock:
+            self._active_index = 0
+
+
+class ModelRouter:
+    """Thread-safe routing over a model pool, with per-session views."""
+
+    def __init__(self, pool, health=provider_health, max_sessions=ROUTER_MAX_SESSIONS):
+        self.pool = pool
+        self.health = health
+        self.max_sessions = max_sessions
+        self.default = SessionRouter(self)
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def session(self, session_id):
+        """The routing view for `session_id`, created on first use (least recently used are dropped)."""
+        if session_id is None:
+            return self.default
+
+        with self._lock:
+            view = self._sessions.get(session_id)
+            if view is None:
+                view = self._sessions[session_id] = SessionRouter(self)
+            self._sessions.move_to_end(session_id)
+
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+
+        return view
+
+    def active_config(self, preferred=0):
+        """
+        The session's preferred provider while its circuit is closed, else the
+        fastest closed provider (no probe slot is claimed).
+        """
+        healthy = []
+
+        for index, cfg in enumerate(self.pool):
+            name = config_name(cfg)
+            if self.health.state(name) == CLOSED:
+                score = self.health.score(name)
+                healthy.append((index != preferred, score is None, score or 0.0, index))
+
+        if not healthy:
+            return self.pool[preferred]
+        return self.pool[min(healthy)[-1]]
+
+    def route(self, preferred=0):
+        """
+        Pool entries to try for one request, best first.
+
+        Providers with an open circuit are skipped. A half-open provider is
+        tried first so its single probe runs; next comes the session's
+        preferred provider if it has rotated away from the primary; the rest
+        are ordered by recent latency and error rate, with unmeasured providers
+        in pool order after them. Nothing here sleeps: an unhealthy provider
+        costs no time until it is probed.
+
+        Ordering claims nothing; call `acquire(cfg)` right before sending to
+        a provider, so probe slots are only taken by attempts that happen.
+        When every circuit is open, the least recently failed provider is
+        still returned (see `last_resort`).
+        """
+        ranked = []
+
+        for index, cfg in enumerate(self.pool):
+            name = config_name(cfg)
+            if not self.health.available(name):
+                continue
+
+            probing = self.health.state(name) == HALF_OPEN
+            pinned = preferred != 0 and index == preferred
+            score = self.health.score(name)
+            ranked.append((not probing, not pinned, score is None, score or 0.0, index, cfg))
+
+        if not ranked:
+            fallback = self.last_resort()
+            return [fallback] if fallback is not None else []
+
+        ranked.sort(key=lambda item: item[:5])
+        return [item[-1] for item in ranked]
+
+    def last_resort(self):
+        """
+        With every circuit open, the provider whose last failure is oldest;
+        None while any provider is available. A single 429 opens a circuit
+        for CIRCUIT_RATE_LIMIT_SECONDS, and per-minute quotas often recover
+        sooner, so a one-provider pool keeps trying instead of refusing all.
+        """
+        if any(self.health.available(config_name(cfg)) for cfg in self.pool):
+            return None
+
+        oldest = min(
+            range(len(self.pool)),
+            key=lambda index: (self.health.last_failure(config_name(self.pool[index])) or 0.0, index),
+        )
+        return self.pool[oldest]
+
+    def acquire(self, cfg):
+        """
+        Claim the right to call `cfg` now (the probe slot when half-open).
+        False means its circuit closed the door since routing: skip it.
+        """
+        if self.health.allow_request(config_name(cfg)):
+            return True
+        return cfg is self.last_resort()
+
 
-    _active_index += 1
+_router = ModelRouter(MODEL_POOL)
 
-    if _active_index >= len(MODEL_POOL):
-        _active_index = 0
 
-    cfg = MODEL_POOL[_active_index]
-    print(f"🔁 Switched to {cfg['provider']} → {cfg['model']}")
+def get_router():
+    return _router
 
 
 # --------------------------------------------------
-# RESET TO PRIMARY
+# MODULE-LEVEL WRAPPERS (DEFAULT SESSION)
 # --------------------------------------------------
 
+def get_active_config():
+    return _router.default.active_config()
+
+
+def rotate_model():
+    _router.default.rotate()
+
+
 def reset_model():
-    global _active_index
-    _active_index = 0
+    _router.default.reset()
+
+
+def route():
+    return _router.default.route()
 
 
 # --------------------------------------------------
 # CREATE LLM INSTANCE
 # --------------------------------------------------
 
-def get_llm():
-
-    cfg = get_active_config()
-
-    provider = cfg["provider"]
-    model = cfg["model"]
-
-    print(f"🤖 Using {provider} → {model}")
+def _create_llm(provider, model):
 
     if provider == "gemini":
         return ChatGoogleGenerativeAI(
@@ -120,3 +275,27 @@ def get_llm():
 
     # This should not be reached if the MODEL_POOL is configured correctly.
     raise ValueError(f"Unknown model provider: {provider}")
+
+
+# Swappable so benchmarks can route the pool to local stand-in chat models.
+_llm_factory = _create_llm
+
+
+def set_llm_factory(factory):
+    """Build LLM clients with `factory(provider, model)`; None restores the real providers."""
+    global _llm_factory
+    _llm_factory = factory or _create_llm
+    invalidate_llm_clients()
+
+
+def get_llm(cfg=None):
+
+    cfg = cfg or get_active_config()
+
+    provider = cfg["provider"]
+    model = cfg["model"]
+
+    print(f"🤖 Using {provider} → {model}")
+
+    # Clients (and their connection pools) are shared process-wide per model.
+    return get_llm_client(provider, model, lambda: _llm_factory(provider, model))
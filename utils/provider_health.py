@@ -0,0 +1,205 @@
+import os
+import threading
+import time
+from collections import deque
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+# --------------------------------------------------
+# ⚙️ CONFIG
+# --------------------------------------------------
+
+# Consecutive failures that open a provider's circuit.
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "3"))
+
+# Seconds an open circuit waits before letting one probe request through.
+CIRCUIT_RESET_SECONDS = float(os.getenv("CIRCUIT_RESET_SECONDS", "30"))
+
+# Rate limits open the circuit at once and for longer: quota rarely returns within seconds.
+CIRCUIT_RATE_LIMIT_SECONDS = float(os.getenv("CIRCUIT_RATE_LIMIT_SECONDS", "60"))
+
+# Recent calls kept per provider for latency percentiles and error rate.
+PROVIDER_STATS_WINDOW = int(os.getenv("PROVIDER_STATS_WINDOW", "50"))
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+# --------------------------------------------------
+# 🔌 CIRCUIT BREAKER
+# --------------------------------------------------
+
+class CircuitBreaker:
+    """
+    closed → (N consecutive failures) → open → (cooldown) → half-open.
+    Half-open admits a single probe: success closes the circuit, failure
+    re-opens it for another cooldown.
+    """
+
+    def __init__(self, failure_threshold=CIRCUIT_FAILURE_THRESHOLD, reset_seconds=CIRCUIT_RESET_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_until = 0.0
+        self.last_failure_at = None
+        self._probe_in_flight = False
+
+    def _refresh(self, now):
+        if self.state == OPEN and now >= self.opened_until:
+            self.state = HALF_OPEN
+            self._probe_in_flight = False
+
+    def current_state(self, now=None):
+        self._refresh(now or time.monotonic())
+        return self.state
+
+    def is_available(self, now=None):
+        """True if a request could be sent now; unlike allow_request, claims nothing."""
+        self._refresh(now or time.monotonic())
+        return self.state == CLOSED or (self.state == HALF_OPEN and not self._probe_in_flight)
+
+    def allow_request(self, now=None):
+        """True if a request may be sent; claims the probe slot when half-open."""
+        self._refresh(now or time.monotonic())
+
+        if self.state == CLOSED:
+            return True
+        if self.state == HALF_OPEN and not self._probe_in_flight:
+            self._probe_in_flight = True
+            return True
+        return False
+
+    def record_success(self):
+        self.state = CLOSED
+        self.failures = 0
+        self._probe_in_flight = False
+
+    def record_failure(self, cooldown=None, now=None):
+        now = now or time.monotonic()
+        self.failures += 1
+        self.last_failure_at = now
+
+        if cooldown is not None or self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+            self.state = OPEN
+            self.opened_until = now + (cooldown or self.reset_seconds)
+            self._probe_in_flight = False
+
+
+# --------------------------------------------------
+# 📈 ROLLING PROVIDER STATS
+# --------------------------------------------------
+
+class ProviderHealth:
+    """
+    Circuit breaker plus a rolling window of (latency, ok) for one provider
+    model. Latency is always time to first token, whether or not the caller streams.
+    """
+
+    def __init__(self, window=PROVIDER_STATS_WINDOW):
+        self.breaker = CircuitBreaker()
+        self.calls = deque(maxlen=window)
+        self.lock = threading.Lock()
+
+    def latency_percentile(self, pct):
+        latencies = sorted(latency for latency, ok in self.calls if ok)
+        if not latencies:
+            return None
+        index = min(len(latencies) - 1, int(round(pct / 100 * (len(latencies) - 1))))
+        return latencies[index]
+
+    def error_rate(self):
+        if not self.calls:
+            return 0.0
+        return sum(1 for _, ok in self.calls if not ok) / len(self.calls)
+
+    def score(self):
+        """Expected cost of a call: median latency inflated by the recent error rate."""
+        p50 = self.latency_percentile(50)
+        if p50 is None:
+            return None
+        return p50 * (1 + 4 * self.error_rate())
+
+
+class HealthRegistry:
+    """Process-wide health of every provider model, keyed by "provider:model"."""
+
+    def __init__(self):
+        self._providers = {}
+        self._lock = threading.Lock()
+
+    def _get(self, name):
+        with self._lock:
+            if name not in self._providers:
+                self._providers[name] = ProviderHealth()
+            return self._providers[name]
+
+    def available(self, name):
+        health = self._get(name)
+        with health.lock:
+            return health.breaker.is_available()
+
+    def last_failure(self, name):
+        """Monotonic time of the provider's latest failure, or None."""
+        health = self._get(name)
+        with health.lock:
+            return health.breaker.last_failure_at
+
+    def allow_request(self, name):
+        health = self._get(name)
+        with health.lock:
+            return health.breaker.allow_request()
+
+    def state(self, name):
+        health = self._get(name)
+        with health.lock:
+            return health.breaker.current_state()
+
+    def score(self, name):
+        health = self._get(name)
+        with health.lock:
+            return health.score()
+
+    def latency_percentile(self, name, pct):
+        health = self._get(name)
+        with health.lock:
+            return health.latency_percentile(pct)
+
+    def record_success(self, name, latency):
+        health = self._get(name)
+        with health.lock:
+            health.calls.append((latency, True))
+            health.breaker.record_success()
+
+    def record_failure(self, name, rate_limited=False):
+        health = self._get(name)
+        with health.lock:
+            health.calls.append((None, False))
+            was_open = health.breaker.state == OPEN
+            health.breaker.record_failure(CIRCUIT_RATE_LIMIT_SECONDS if rate_limited else None)
+            if health.breaker.state == OPEN and not was_open:
+                print(f"🔌 Circuit opened for {name}")
+
+    def snapshot(self):
+        """{name: {state, p50, p95, error_rate, calls}} for dashboards and logs."""
+        with self._lock:
+            items = list(self._providers.items())
+
+        snapshot = {}
+        for name, health in items:
+            with health.lock:
+                snapshot[name] = {
+                    "state": health.breaker.current_state(),
+                    "p50": health.latency_percentile(50),
+                    "p95": health.latency_percentile(95),
+                    "error_rate": round(health.error_rate(), 3),
+                    "calls": len(health.calls),
+                }
+        return snapshot
+
+
+provider_health = HealthRegistry()
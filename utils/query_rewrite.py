@@ -0,0 +1,85 @@
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+# --------------------------------------------------
+# ⚙️ CONFIG
+# --------------------------------------------------
+
+MULTI_QUERY = os.getenv("MULTI_QUERY", "false").lower() in ("1", "true", "yes")
+MULTI_QUERY_VARIANTS = int(os.getenv("MULTI_QUERY_VARIANTS", "3"))
+
+# Seconds to wait for the rewrite LLM call before answering from the original query alone.
+MULTI_QUERY_REWRITE_BUDGET = float(os.getenv("MULTI_QUERY_REWRITE_BUDGET", "1.5"))
+
+REWRITE_PROMPT = """
+Generate {n} different versions of this question to improve document retrieval.
+Return one question per line with no numbering or commentary.
+
+{question}
+"""
+
+# Shared pool so an abandoned (slow) rewrite never blocks the request that gave up on it.
+_rewrite_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="query-rewrite")
+
+_NUMBERING_RE = re.compile(r"^\s*(?:[-*•]|\(?\d+[.)])\s*")
+
+
+# --------------------------------------------------
+# ✂️ PARSE REWRITTEN QUERIES
+# --------------------------------------------------
+
+def parse_rewritten_queries(text, limit=None):
+    """Turn an LLM rewrite response into a clean, de-duplicated list of questions."""
+    queries = []
+    seen = set()
+
+    for line in text.split("\n"):
+        line = _NUMBERING_RE.sub("", line.strip()).strip().strip('"')
+
+        # Skip empty lines and preambles such as "Here are 3 versions..."
+        if not line:
+            continue
+        if line.lower().startswith("here are"):
+            continue
+        if "improvement" in line.lower():
+            continue
+
+        key = line.lower()
+        if key in seen:
+            continue
+        seen.add(key)
+        queries.append(line)
+
+    return queries[:limit] if limit else queries
+
+
+# --------------------------------------------------
+# 🔀 REWRITE WITH A LATENCY BUDGET
+# --------------------------------------------------
+
+def rewrite_query(llm, question, n=MULTI_QUERY_VARIANTS):
+    response = llm.invoke(REWRITE_PROMPT.format(n=n, question=question))
+    return parse_rewritten_queries(getattr(response, "content", str(response)), limit=n)
+
+
+def submit_rewrite(rewrite, question):
+    """Start `rewrite(question)` in the background and return its future."""
+    return _rewrite_pool.submit(rewrite, question)
+
+
+def rewrite_result(future, budget=MULTI_QUERY_REWRITE_BUDGET):
+    """Variants from a submitted rewrite, or [] if it failed or overran the budget."""
+    try:
+        return future.result(timeout=budget)
+    except TimeoutError:
+        print(f"⏱️ Query rewrite exceeded {budget}s budget; using original query only")
+    except Exception as e:
+        print(f"⚠️ Query rewrite failed: {e}")
+
+    return []
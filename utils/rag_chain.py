@@ -1,8 +1,18 @@
 import time
+
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
 
-from utils.model_manager import get_llm, rotate_model, MODEL_POOL, get_active_config
+from utils.context import build_context, estimate_tokens
+from utils.errors import is_rate_limit_error
+from utils.hedging import HEDGE_REQUESTS, first_token_within, race_first_token
+from utils.model_manager import config_name, get_llm, get_router
+from utils.provider_health import provider_health
+from utils.query_rewrite import MULTI_QUERY, rewrite_query
+from utils.reranker import load_reranker
+from utils.resources import get_answer_cache
+from utils.retrievers import build_retriever
+from utils.tracing import current_span, metrics, span
 
 
 
@@ -21,106 +31,355 @@ Question:
 {input}
 """)
 
+NOT_FOUND_ANSWER = "I cannot find this in the document."
+
+
+# --------------------------------------------------
+# FAILURE HANDLING
+# --------------------------------------------------
+
+def _handle_failure(active_model, e, error_log):
+    """Log a provider failure and feed it to the provider's circuit breaker."""
+    msg = str(e).lower()
+    error_log.append(f"{active_model}: {str(e)}")
+
+    # Handle specific, recoverable errors like rate limits or resource exhaustion.
+    rate_limited = is_rate_limit_error(msg)
+    if rate_limited:
+        print(f"⚠️ Rate limit hit on {active_model}")
+
+    # Handle configuration errors (e.g., missing API keys, invalid model).
+    # This includes the custom "OpenRouter is not configured" error.
+    elif (
+        "model not found" in msg
+        or "no endpoints found" in msg
+        or "permission" in msg
+        or "forbidden" in msg
+        or "invalid api key" in msg
+        or "authentication" in msg
+        or "not configured" in msg
+        or "401" in msg
+        or "403" in msg
+        or "404" in msg
+    ):
+        print(f"⚠️ Provider misconfigured or unavailable for {active_model}: {e}")
+
+    # For any other unknown errors, move on to the next provider.
+    else:
+        print(f"⚠️ Error on {active_model}: {e}")
+
+    # No sleep: the breaker keeps later requests away from a failing provider instead.
+    provider_health.record_failure(active_model, rate_limited=rate_limited)
+    metrics.incr(
+        "rag_provider_failures_total",
+        provider=active_model,
+        reason="rate_limit" if rate_limited else "error",
+    )
+
+
+def _exhausted_message(error_log):
+    print("🚫 All providers exhausted")
+
+    # If all providers fail, return a comprehensive error message to the user.
+    details = "\n".join(error_log[-3:]) or "All providers are temporarily unavailable (circuit open)."
+    return (
+        "⚠️ Could not generate an answer. All LLM providers failed.\n\n"
+        f"**Error Details:**\n{details}\n\n"
+        "Please check your API key configurations and model access."
+    )
+
+
+def _make_chain(llm, docs, model=None):
+    # This chain injects retrieved context, formats the prompt, and calls the LLM.
+    # Chunks are merged, de-duplicated and trimmed to the model's token budget.
+    context = build_context(docs, model)
+
+    # Counted per attempt: a failed-over prompt is still billed.
+    prompt_tokens = estimate_tokens(context)
+    metrics.incr("rag_tokens_total", prompt_tokens, kind="prompt")
+
+    llm_span = current_span()
+    if llm_span is not None:
+        llm_span.set(prompt_tokens=prompt_tokens)
+
+    return (
+        {
+            "context": lambda _: context,
+            "input": lambda x: x,
+        }
+        | PROMPT
+        | llm
+        | StrOutputParser()
+    )
+
 
 # --------------------------------------------------
 # BUILD RAG CHAIN WITH PROVIDER FAILOVER
 # --------------------------------------------------
 
-def build_rag_chain(vectorstore):
+def build_rag_chain(
+    vectorstore,
+    streaming=False,
+    fingerprint=None,
+    answer_cache=None,
+    keyword_index=None,
+    multi_query=None,
+    rerank=None,
+    hedge=None,
+    router=None,
+):
     """
     Builds a Retrieval-Augmented Generation (RAG) chain with a failover mechanism.
-    It tries the primary LLM (Gemini) first, then falls back to a secondary (OpenRouter).
+    Providers are tried in health order (`router.route()`): open circuits are skipped
+    and the fastest healthy provider goes first, Gemini before OpenRouter when
+    neither has history. Retrieval runs once and is reused across failovers.
+
+    With `streaming=True` the returned callable gives `(token_iterator, docs)`
+    instead of `(answer, docs)`. Tokens come straight from the provider via
+    `chain.stream`; failover still applies until the first token arrives, and a
+    provider silent for FIRST_TOKEN_TIMEOUT seconds counts as failed.
+
+    When the index `fingerprint` is known, answers are served from and written
+    to the persistent answer cache, so repeated questions skip retrieval and the LLM.
+
+    With a BM25 `keyword_index`, retrieval fuses keyword and vector results (RRF).
+
+    With `multi_query=True` (default: MULTI_QUERY env), the question is also
+    rewritten by the active LLM into variants that are searched concurrently
+    and fused; the rewrite is skipped if it overruns MULTI_QUERY_REWRITE_BUDGET.
+
+    `rerank` ("lexical" / "cross_encoder"; default: RERANK env) retrieves
+    RERANK_CANDIDATES chunks and keeps the reranker's top 4 within RERANK_BUDGET_MS.
+
+    With `hedge=True` (default: HEDGE_REQUESTS env), a provider that has not
+    produced a first token within its hedge delay (p95 of recent latency) is
+    raced against the next healthy provider; the slower stream is closed.
     """
-    retriever = vectorstore.as_retriever(search_kwargs={"k": 4})
+    if hedge is None:
+        hedge = HEDGE_REQUESTS
+
+    # Per-session routing view; failovers here don't move other sessions' provider.
+    if router is None:
+        router = get_router().default
+    if multi_query is None:
+        multi_query = MULTI_QUERY
+
+    rewrite = (lambda question: rewrite_query(get_llm(router.active_config()), question)) if multi_query else None
+    retriever = build_retriever(
+        vectorstore,
+        keyword_index,
+        k=4,
+        rewrite=rewrite,
+        reranker=load_reranker(rerank),
+    )
+
+    if fingerprint and answer_cache is None:
+        answer_cache = get_answer_cache()
+    if not fingerprint:
+        answer_cache = None
+
+    def cached(question):
+        if answer_cache is None:
+            return None, None
+
+        embed_query = vectorstore.embeddings.embed_query if answer_cache.semantic else None
+        try:
+            with span("answer_cache"):
+                hit, vector = answer_cache.lookup(fingerprint, question, embed_query)
+        except Exception as e:
+            # The cache is an optimisation; never fail a question because of it.
+            print(f"⚠️ Answer cache lookup failed: {e}")
+            return None, None
+
+        if hit:
+            print("⚡ Answer cache hit")
+            metrics.incr("rag_cache_hits_total", cache="answer")
+        else:
+            metrics.incr("rag_cache_misses_total", cache="answer")
+        return hit, vector
+
+    def retrieve(question):
+        with span("retrieve") as retrieve_span:
+            docs = retriever.invoke(question)
+            retrieve_span.set(docs=len(docs))
+        return docs
+
+    def record_answer(active_model, answer):
+        tokens = estimate_tokens(answer)
+        metrics.incr("rag_provider_success_total", provider=active_model)
+        metrics.incr("rag_tokens_total", tokens, kind="completion")
+
+        llm_span = current_span()
+        if llm_span is not None:
+            llm_span.set(completion_tokens=tokens)
+
+    def remember(question, answer, docs, vector):
+        if answer_cache is None:
+            return
+        try:
+            answer_cache.store(fingerprint, question, answer, docs, vector)
+        except Exception as e:
+            print(f"⚠️ Answer cache store failed: {e}")
 
     def ask(question):
-        attempts = 0
-        max_attempts = len(MODEL_POOL)
+        with span("ask", streaming=False) as ask_span:
+            answer, docs = answer_question(question)
+            ask_span.set(docs=len(docs))
+        metrics.observe("rag_answer_seconds", ask_span.seconds, streaming="false")
+        return answer, docs
+
+    def answer_question(question):
+        hit, vector = cached(question)
+        if hit:
+            return hit
+
+        docs = retrieve(question)
+        if not docs:
+            print("ℹ️ No relevant context found in vector store")
+            return NOT_FOUND_ANSWER, []
+
+        if hedge:
+            tokens, docs = stream_answer(question, docs, vector)
+            return "".join(tokens), docs
 
         error_log = []
 
-        while attempts < max_attempts:
+        for cfg in router.route():
+            active_model = config_name(cfg)
+            if not router.acquire(cfg):
+                continue
 
             try:
-                cfg = get_active_config()
-                active_model = f"{cfg['provider']}:{cfg.get('model', 'N/A')}"
-                llm = get_llm()
+                llm = get_llm(cfg)
                 print(f"🤖 Trying model: {active_model}")
 
-                docs = retriever.invoke(question)
-                if not docs:
-                    print("ℹ️ No relevant context found in vector store")
-                    return "I cannot find this in the document.", []
-            
-                # This chain retrieves context, formats the prompt, and calls the LLM.
-                chain = (
-                    {
-                        "context": lambda _: docs,
-                        "input": lambda x: x,
-                    }
-                    | PROMPT
-                    | llm
-                    | StrOutputParser()
-                )
-
                 # Execute the chain and handle potential errors.
-                answer = chain.invoke(question)
+                # Streamed even here, so provider health records time to first
+                # token on every path; routing and hedge delays compare like with like.
+                started = time.monotonic()
+                with span("llm", provider=active_model):
+                    first, tokens = first_token_within(lambda: _make_chain(llm, docs, cfg.get('model')).stream(question))
+                    latency = time.monotonic() - started
+                    answer = first + "".join(tokens)
+                    record_answer(active_model, answer)
+                provider_health.record_success(active_model, latency)
+
                 print(f"✅ Success with model: {active_model}")
+                remember(question, answer, docs, vector)
                 return answer, docs
 
             except Exception as e:
-                msg = str(e).lower()
-                error_log.append(f"{active_model}: {str(e)}")
-
-                # Handle specific, recoverable errors like rate limits or resource exhaustion.
-                if (
-                    "resource_exhausted" in msg
-                    or "quota" in msg
-                    or "rate limit" in msg
-                    or "429" in msg
-                ):
-                    print(f"⚠️ Rate limit hit on {active_model}")
-                    rotate_model()
-                    attempts += 1
-                    time.sleep(2)
-                    continue
-
-                # Handle configuration errors (e.g., missing API keys, invalid model).
-                # This includes the custom "OpenRouter is not configured" error.
-                if (
-                    "model not found" in msg
-                    or "no endpoints found" in msg
-                    or "permission" in msg
-                    or "forbidden" in msg
-                    or "invalid api key" in msg
-                    or "authentication" in msg
-                    or "not configured" in msg
-                    or "401" in msg
-                    or "403" in msg
-                    or "404" in msg
-                ):
-                    print(f"⚠️ Provider misconfigured or unavailable for {active_model}: {e}")
-                    rotate_model()
-                    attempts += 1
-                    time.sleep(1)
-                    continue
-
-                # For any other unknown errors, rotate to the next provider.
-                print(f"⚠️ Error on {active_model}: {e}")
-                rotate_model()
-                attempts += 1
-                time.sleep(1)
+                _handle_failure(active_model, e, error_log)
+                router.rotate(cfg)
+
+        return _exhausted_message(error_log), []
+
+    def first_token(question, docs, error_log):
+        """(active_model, first_token, tokens) from the routed providers, or None."""
+        def starter(cfg):
+            return lambda: _make_chain(get_llm(cfg), docs, cfg.get('model')).stream(question)
+
+        candidates = router.route()
+
+        if hedge:
+            by_name = {config_name(cfg): cfg for cfg in candidates}
+
+            def on_failure(name, e):
+                _handle_failure(name, e, error_log)
+                router.rotate(by_name[name])
+
+            return race_first_token(
+                [(name, starter(cfg)) for name, cfg in by_name.items()],
+                on_failure,
+                acquire=lambda name: router.acquire(by_name[name]),
+            )
+
+        for cfg in candidates:
+            active_model = config_name(cfg)
+            if not router.acquire(cfg):
                 continue
 
-        print("🚫 All providers exhausted")
+            try:
+                print(f"🤖 Trying model: {active_model}")
+
+                started = time.monotonic()
+                with span("llm_first_token", provider=active_model):
+                    # Pull the first token here, with a deadline, so a dead or
+                    # hung provider still fails over.
+                    first, tokens = first_token_within(starter(cfg))
+                provider_health.record_success(active_model, time.monotonic() - started)
+                return active_model, first, tokens
+
+            except Exception as e:
+                _handle_failure(active_model, e, error_log)
+                router.rotate(cfg)
+
+        return None
+
+    def ask_stream(question):
+        started = time.monotonic()
+        # The span ends at the first token, so it measures time-to-first-token end to end.
+        with span("ask", streaming=True) as ask_span:
+            tokens, docs = stream_question(question)
+            ask_span.set(docs=len(docs))
+        return _timed_answer(tokens, started), docs
+
+    def stream_question(question):
+        hit, vector = cached(question)
+        if hit:
+            answer, docs = hit
+            return iter([answer]), docs
+
+        docs = retrieve(question)
+        if not docs:
+            print("ℹ️ No relevant context found in vector store")
+            return iter([NOT_FOUND_ANSWER]), []
+
+        return stream_answer(question, docs, vector)
+
+    def stream_answer(question, docs, vector):
+        error_log = []
+        started_at = time.monotonic()
+        started = first_token(question, docs, error_log)
+
+        if started is None:
+            return iter([_exhausted_message(error_log)]), []
+
+        active_model, first, tokens = started
+        print(f"✅ Streaming from model: {active_model}")
+        metrics.observe("rag_time_to_first_token_seconds", time.monotonic() - started_at, provider=active_model)
+        metrics.incr("rag_provider_success_total", provider=active_model)
+
+        def on_complete(answer):
+            metrics.observe("rag_stream_seconds", time.monotonic() - started_at, provider=active_model)
+            metrics.incr("rag_tokens_total", estimate_tokens(answer), kind="completion")
+            remember(question, answer, docs, vector)
+
+        return _continue_stream(first, tokens, active_model, on_complete), docs
+
+    return ask_stream if streaming else ask
+
+
+def _timed_answer(tokens, started):
+    """Pass tokens through; a stream read to the end records its full answer time."""
+    yield from tokens
+    metrics.observe("rag_answer_seconds", time.monotonic() - started, streaming="true")
+
+
+def _continue_stream(first, tokens, active_model, on_complete=None):
+    parts = [first]
+    yield first
 
-        # If all providers fail, return a comprehensive error message to the user.
-        details = "\n".join(error_log[-3:])
-        return (
-            "⚠️ Could not generate an answer. All LLM providers failed.\n\n"
-            f"**Error Details:**\n{details}\n\n"
-            "Please check your API key configurations and model access.",
-            [],
-        )
+    try:
+        for token in tokens:
+            parts.append(token)
+            yield token
+    except Exception as e:
+        # Tokens already reached the user, so switching providers is no longer possible.
+        print(f"⚠️ Stream interrupted on {active_model}: {e}")
+        yield f"\n\n⚠️ Response interrupted: {e}"
+        return
 
-    return ask
+    # Only complete answers are worth caching.
+    if on_complete is not None:
+        on_complete("".join(parts))
@@ -0,0 +1,148 @@
+import math
+import os
+import time
+from collections import Counter
+
+from dotenv import load_dotenv
+
+from utils.bm25 import tokenize
+from utils.resources import get_reranker
+
+try:
+    from sentence_transformers import CrossEncoder
+except ImportError:  # optional dependency
+    CrossEncoder = None
+
+load_dotenv()
+
+
+# --------------------------------------------------
+# ⚙️ CONFIG
+# --------------------------------------------------
+# RERANK: off (default) | lexical | cross_encoder
+# cross_encoder needs `sentence-transformers`; without it lexical is used.
+
+RERANK = os.getenv("RERANK", "off").lower()
+RERANK_CANDIDATES = int(os.getenv("RERANK_CANDIDATES", "50"))
+RERANK_MODEL = os.getenv("RERANK_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+RERANK_BATCH_SIZE = int(os.getenv("RERANK_BATCH_SIZE", "16"))
+
+# CPU time allowed for scoring; candidates not scored in time keep retrieval order.
+RERANK_BUDGET_MS = float(os.getenv("RERANK_BUDGET_MS", "300"))
+
+
+# --------------------------------------------------
+# 🔤 LEXICAL OVERLAP SCORER
+# --------------------------------------------------
+
+class LexicalReranker:
+    """
+    Cheap query/chunk term-overlap scorer: query terms weighted by their
+    rarity within the candidate set, normalised for chunk length.
+    Microseconds per candidate, so it never needs the time budget.
+    """
+
+    def score(self, query, texts):
+        terms = set(tokenize(query))
+        if not terms:
+            return [0.0] * len(texts)
+
+        chunk_terms = [Counter(tokenize(text)) for text in texts]
+        n = len(texts)
+        doc_freq = Counter(term for counts in chunk_terms for term in terms if term in counts)
+
+        scores = []
+        for counts in chunk_terms:
+            length = sum(counts.values()) or 1
+            score = sum(
+                math.log(1 + n / doc_freq[term]) * (1 + math.log(counts[term]))
+                for term in terms if term in counts
+            )
+            scores.append(score / math.sqrt(length))
+
+        return scores
+
+    def rerank(self, query, docs, budget_ms=RERANK_BUDGET_MS):
+        scores = self.score(query, [doc.page_content for doc in docs])
+        order = sorted(range(len(docs)), key=lambda i: (-scores[i], i))
+        return [docs[i] for i in order]
+
+
+# --------------------------------------------------
+# 🧠 LOCAL CROSS-ENCODER
+# --------------------------------------------------
+
+class CrossEncoderReranker:
+    """
+    Scores (query, chunk) pairs with a small local cross-encoder on CPU.
+
+    Candidates are scored best-retrieval-first in batches until the time
+    budget runs out; the rest keep their retrieval order after the scored ones.
+    """
+
+    def __init__(self, model_name=RERANK_MODEL, batch_size=RERANK_BATCH_SIZE):
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.model = CrossEncoder(model_name, device="cpu")
+
+    def rerank(self, query, docs, budget_ms=RERANK_BUDGET_MS):
+        deadline = time.monotonic() + budget_ms / 1000
+        scored = []
+
+        for start in range(0, len(docs), self.batch_size):
+            if scored and time.monotonic() > deadline:
+                print(f"⏱️ Rerank budget hit after {len(scored)}/{len(docs)} candidates")
+                break
+
+            batch = docs[start:start + self.batch_size]
+            scores = self.model.predict([(query, doc.page_content) for doc in batch])
+            scored.extend(zip(scores, batch))
+
+        ranked = [doc for _, doc in sorted(scored, key=lambda item: -float(item[0]))]
+        return ranked + docs[len(scored):]
+
+
+def load_reranker(kind=None):
+    """Shared reranker for `kind` (RERANK env by default), or None when disabled."""
+    kind = (kind or RERANK).lower()
+
+    if kind in ("", "off", "none", "false"):
+        return None
+
+    if kind == "cross_encoder":
+        if CrossEncoder is not None:
+            return get_reranker(("cross_encoder", RERANK_MODEL), CrossEncoderReranker)
+        print("⚠️ sentence-transformers not installed; using lexical reranking")
+
+    elif kind != "lexical":
+        raise ValueError(f"Unknown RERANK '{kind}'. Use one of: off, lexical, cross_encoder")
+
+    return get_reranker(("lexical",), LexicalReranker)
+
+
+# --------------------------------------------------
+# 🎯 RERANKING RETRIEVER
+# --------------------------------------------------
+
+class RerankingRetriever:
+    """Fetches a wide candidate set from `base_retriever` and keeps the reranker's top k."""
+
+    def __init__(self, base_retriever, reranker, k=4, candidates=RERANK_CANDIDATES, budget_ms=RERANK_BUDGET_MS):
+        self.base_retriever = base_retriever
+        self.reranker = reranker
+        self.k = k
+        self.candidates = candidates
+        self.budget_ms = budget_ms
+
+    @property
+    def vectorstore(self):
+        return self.base_retriever.vectorstore
+
+    def invoke(self, query):
+        return self.search(query, self.k)
+
+    def search(self, query, k):
+        docs = self.base_retriever.search(query, max(k, self.candidates))
+        if len(docs) <= k:
+            return docs
+        return self.reranker.rerank(query, docs, self.budget_ms)[:k]
@@ -2,19 +2,44 @@ import shutil
 import os
 import streamlit as st
 
+from utils.index_versions import persist_lock
+from utils.jobs import job_manager
+from utils.resources import invalidate_vectorstores
+
 UPLOAD_DIR = "data/uploads"
 VECTOR_DIR = "vectorstore"
 
+# How long a reset waits for a cancelled indexing job to stop.
+RESET_JOB_WAIT_SECONDS = 30
+
 
 def reset_app():
-    # Delete uploaded files
-    if os.path.exists(UPLOAD_DIR):
-        shutil.rmtree(UPLOAD_DIR)
-        os.makedirs(UPLOAD_DIR)
+    """Delete uploads, the index and session state. False if an indexing job would not stop."""
+    # A background job writes into both folders; stop it before deleting them.
+    pending = [job for job in job_manager.jobs() if not job.finished]
+    for job in pending:
+        job_manager.cancel(job.id)
+    if not all(job.wait(RESET_JOB_WAIT_SECONDS) for job in pending):
+        return False
+
+    try:
+        # Another process (the API) may be building into the same folders.
+        with persist_lock(VECTOR_DIR, timeout=0):
+            # Drop shared indexes and close their files first: Windows refuses to
+            # delete a SQLite file that still has an open connection.
+            invalidate_vectorstores()
+
+            # Delete uploaded files
+            if os.path.exists(UPLOAD_DIR):
+                shutil.rmtree(UPLOAD_DIR)
+                os.makedirs(UPLOAD_DIR)
 
-    # Delete vectorstore
-    if os.path.exists(VECTOR_DIR):
-        shutil.rmtree(VECTOR_DIR)
+            # Delete vectorstore
+            if os.path.exists(VECTOR_DIR):
+                shutil.rmtree(VECTOR_DIR)
+    except TimeoutError:
+        return False
 
     # Clear all session state keys so no stale vectorstore/chat state survives.
     st.session_state.clear()
+    return True
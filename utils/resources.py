@@ -0,0 +1,206 @@
+import os
+import threading
+import time
+
+from dotenv import load_dotenv
+
+from utils.answer_cache import AnswerCache
+from utils.embedding_cache import EmbeddingCache
+
+load_dotenv()
+
+# A superseded index stays loaded for sessions still chatting with it, and is
+# dropped once nobody has looked it up for this long.
+SUPERSEDED_INDEX_IDLE_SECONDS = float(os.getenv("SUPERSEDED_INDEX_IDLE_SECONDS", "1800"))
+
+
+# --------------------------------------------------
+# 🧩 PROCESS-WIDE SHARED RESOURCES
+# --------------------------------------------------
+# Streamlit re-runs the script per interaction and per session, so anything
+# expensive to build (LLM clients with their HTTP pools, loaded FAISS indexes)
+# lives here once per process instead of once per rerun/session.
+
+class SharedRegistry:
+    """Thread-safe get-or-create map with one build lock per key."""
+
+    def __init__(self):
+        self._items = {}
+        self._key_locks = {}
+        self._lock = threading.Lock()
+
+    def get(self, key, factory=None):
+        with self._lock:
+            if key in self._items:
+                return self._items[key]
+            if factory is None:
+                return None
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+
+        # Build outside the registry lock so slow loads don't block other keys.
+        with key_lock:
+            with self._lock:
+                if key in self._items:
+                    return self._items[key]
+
+            value = factory()
+
+            with self._lock:
+                self._items[key] = value
+                self._key_locks.pop(key, None)
+
+        return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._items[key] = value
+
+    def pop(self, key):
+        with self._lock:
+            return self._items.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+    def keys(self):
+        with self._lock:
+            return list(self._items)
+
+
+_llm_clients = SharedRegistry()
+_vectorstores = SharedRegistry()
+_keyword_indexes = SharedRegistry()
+_rerankers = SharedRegistry()
+_singletons = SharedRegistry()
+
+
+# --------------------------------------------------
+# 🤖 LLM CLIENTS
+# --------------------------------------------------
+
+def get_llm_client(provider, model, factory):
+    """One pooled client per (provider, model) for the whole process."""
+    return _llm_clients.get((provider, model), factory)
+
+
+def invalidate_llm_clients():
+    _llm_clients.clear()
+
+
+def get_reranker(key, factory):
+    """Rerank models are loaded once per process and shared by every session."""
+    return _rerankers.get(key, factory)
+
+
+# --------------------------------------------------
+# 📦 VECTORSTORES (BY CORPUS FINGERPRINT)
+# --------------------------------------------------
+
+_index_lock = threading.Lock()
+_last_used = {}
+_successors = {}
+
+
+def get_vectorstore(fingerprint, loader=None):
+    """Shared index for `fingerprint`; `loader()` builds it on first use if given."""
+    if not fingerprint:
+        return None
+
+    db = _vectorstores.get(fingerprint, loader)
+    if db is not None:
+        with _index_lock:
+            _last_used[fingerprint] = time.monotonic()
+    return db
+
+
+def register_vectorstore(fingerprint, db, replaces=None):
+    """
+    Publish `db` under `fingerprint`. An index already registered for the same
+    fingerprint is kept so every session keeps sharing one copy.
+
+    `replaces` is the version this one supersedes. Sessions mid-conversation
+    keep using it (its open files stay readable) until it has gone unused for
+    SUPERSEDED_INDEX_IDLE_SECONDS; `latest_fingerprint` leads them to this one.
+    """
+    now = time.monotonic()
+
+    with _index_lock:
+        _successors.pop(fingerprint, None)
+        if replaces and replaces != fingerprint:
+            _successors[replaces] = fingerprint
+            _last_used.setdefault(replaces, now)
+
+        idle = [
+            old for old in _successors
+            if now - _last_used.get(old, 0.0) > SUPERSEDED_INDEX_IDLE_SECONDS
+        ]
+        for old in idle:
+            _last_used.pop(old, None)
+
+    for old in idle:
+        _vectorstores.pop(old)
+        _keyword_indexes.pop(old)
+
+    existing = _vectorstores.get(fingerprint)
+    if existing is not None:
+        return existing
+
+    _vectorstores.put(fingerprint, db)
+    return db
+
+
+def latest_fingerprint(fingerprint):
+    """Follow replacements from `fingerprint` to the newest published version."""
+    seen = set()
+
+    with _index_lock:
+        while fingerprint in _successors and fingerprint not in seen:
+            seen.add(fingerprint)
+            fingerprint = _successors[fingerprint]
+
+    return fingerprint
+
+
+def invalidate_vectorstores(fingerprint=None):
+    """
+    Drop shared indexes (all of them by default) and close their SQLite
+    files, so the directories behind them can be deleted, even on Windows.
+    """
+    if fingerprint is None:
+        fingerprints = set(_vectorstores.keys()) | set(_keyword_indexes.keys())
+        with _index_lock:
+            _last_used.clear()
+            _successors.clear()
+    else:
+        fingerprints = {fingerprint}
+
+    for fp in fingerprints:
+        db = _vectorstores.pop(fp)
+        keyword_index = _keyword_indexes.pop(fp)
+
+        close = getattr(getattr(db, "docstore", None), "close", None)
+        if close is not None:
+            close()
+        if keyword_index is not None:
+            keyword_index.close()
+
+
+def get_keyword_index(fingerprint, loader=None):
+    """Shared BM25 index for `fingerprint`, opened once per process via `loader()`."""
+    if not fingerprint:
+        return None
+    return _keyword_indexes.get(fingerprint, loader)
+
+
+# --------------------------------------------------
+# 💬 ANSWER + EMBEDDING CACHES
+# --------------------------------------------------
+
+def get_answer_cache():
+    return _singletons.get("answer_cache", AnswerCache)
+
+
+def get_embedding_cache():
+    """The default on-disk embedding cache, opened once instead of per search or batch."""
+    return _singletons.get("embedding_cache", EmbeddingCache)
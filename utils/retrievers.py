@@ -0,0 +1,293 @@
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from dotenv import load_dotenv
+
+from utils.bm25 import tokenize
+from utils.embedding_cache import chunk_key
+from utils.index_factory import is_lossy
+from utils.query_rewrite import MULTI_QUERY_REWRITE_BUDGET, rewrite_result, submit_rewrite
+from utils.reranker import RerankingRetriever
+from utils.resources import get_embedding_cache
+
+load_dotenv()
+
+
+# --------------------------------------------------
+# ⚙️ CONFIG
+# --------------------------------------------------
+
+# How many candidates per final result to pull from a compressed index
+# before re-ranking them with full-precision vectors.
+FULL_PRECISION_CANDIDATES = int(os.getenv("FULL_PRECISION_CANDIDATES", "4"))
+
+# Hybrid retrieval: candidates taken from each ranker before fusion, and the
+# reciprocal rank fusion constant (higher = flatter weighting of ranks).
+HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", "20"))
+RRF_K = int(os.getenv("RRF_K", "60"))
+
+# Answer purely lexical lookups (part codes, clause numbers) from BM25 alone.
+HYBRID_LEXICAL_SHORTCUT = os.getenv("HYBRID_LEXICAL_SHORTCUT", "true").lower() in ("1", "true", "yes")
+
+# Share of a query's terms (stopwords excluded) that must be identifiers for the
+# shortcut: "ab-1234 error" qualifies, a question that mentions "version 3.5" does not.
+HYBRID_LEXICAL_MIN_SHARE = float(os.getenv("HYBRID_LEXICAL_MIN_SHARE", "0.5"))
+
+# Identifier-like tokens: digits combined with letters or separators, e.g. "4.2.1",
+# "ab-1234", "x86". Plain numbers such as years are not treated as identifiers.
+_IDENTIFIER_RE = re.compile(r"(?=[\w.\-/]*\d)(?=[\w.\-/]*[a-z_.\-/])[\w.\-/]+")
+
+# Threads used to run per-variant searches side by side (FAISS and SQLite release the GIL).
+SEARCH_MAX_WORKERS = int(os.getenv("SEARCH_MAX_WORKERS", "4"))
+
+_search_pool = ThreadPoolExecutor(max_workers=SEARCH_MAX_WORKERS, thread_name_prefix="search")
+
+
+def _map_concurrently(fn, items):
+    if len(items) <= 1:
+        return [fn(item) for item in items]
+    return list(_search_pool.map(fn, items))
+
+
+# --------------------------------------------------
+# 🔎 VECTOR RETRIEVER
+# --------------------------------------------------
+
+class VectorRetriever:
+    """
+    Top-k similarity search over a FAISS vectorstore.
+
+    When the index stores truncated or quantised vectors, a wider candidate
+    set is fetched and re-ranked against the full-precision vectors kept in
+    the on-disk embedding cache, recovering most of the recall compression loses.
+    """
+
+    def __init__(self, vectorstore, k=4, cache=None):
+        self.vectorstore = vectorstore
+        self.k = k
+        self.cache = cache
+
+        embeddings = vectorstore.embedding_function
+        self.full_precision = (
+            hasattr(embeddings, "embed_query_full")
+            and (bool(getattr(embeddings, "dim", 0)) or is_lossy(vectorstore.index))
+        )
+
+    def invoke(self, query):
+        return self.search(query, self.k)
+
+    def search(self, query, k):
+        return self.search_many([query], k)[0]
+
+    def search_many(self, queries, k):
+        """Search several queries, embedding all of them in one batched call."""
+        embeddings = self.vectorstore.embedding_function
+
+        if not hasattr(embeddings, "embed_queries_full"):
+            return [self.vectorstore.similarity_search(query, k=k) for query in queries]
+
+        full_queries = embeddings.embed_queries_full(queries)
+        return _map_concurrently(lambda vector: self.search_by_vector(vector, k), full_queries)
+
+    def search_by_vector(self, full_query, k):
+        embeddings = self.vectorstore.embedding_function
+
+        if not self.full_precision:
+            return self.vectorstore.similarity_search_by_vector(embeddings.truncate(full_query), k=k)
+
+        full_query = np.asarray(full_query, dtype=np.float32)
+
+        candidates = self.vectorstore.similarity_search_with_score_by_vector(
+            embeddings.truncate(full_query),
+            k=k * FULL_PRECISION_CANDIDATES,
+        )
+
+        return rerank_full_precision(
+            full_query,
+            [doc for doc, _ in candidates],
+            embeddings.model_name,
+            self.cache if self.cache is not None else get_embedding_cache(),
+        )[:k]
+
+
+def rerank_full_precision(full_query, docs, model_name, cache):
+    """
+    Order `docs` by exact L2 distance between `full_query` and each chunk's
+    cached full-width vector. Chunks missing from the cache keep their
+    approximate order after the re-ranked ones.
+    """
+    keys = [chunk_key(doc.page_content, model_name) for doc in docs]
+    vectors = cache.get_many(keys)
+
+    scored = []
+    unscored = []
+    for doc, key in zip(docs, keys):
+        vector = vectors.get(key)
+        if vector is None or vector.shape != full_query.shape:
+            unscored.append(doc)
+        else:
+            scored.append((float(np.sum((vector - full_query) ** 2)), doc))
+
+    scored.sort(key=lambda item: item[0])
+
+    return [doc for _, doc in scored] + unscored
+
+
+# --------------------------------------------------
+# 🔀 HYBRID BM25 + VECTOR RETRIEVER
+# --------------------------------------------------
+
+def doc_key(doc):
+    """Docstore id when known, else the chunk text; used to fuse and dedupe results."""
+    return getattr(doc, "id", None) or doc.page_content
+
+
+def reciprocal_rank_fusion(rankings, k=RRF_K):
+    """Fuse several best-first lists of documents: score = Σ 1 / (k + rank)."""
+    scores = {}
+    docs = {}
+
+    for ranking in rankings:
+        for rank, doc in enumerate(ranking, start=1):
+            key = doc_key(doc)
+            scores[key] = scores.get(key, 0.0) + 1.0 / (k + rank)
+            docs.setdefault(key, doc)
+
+    ordered = sorted(scores, key=scores.get, reverse=True)
+    return [docs[key] for key in ordered]
+
+
+class HybridRetriever:
+    """
+    BM25 keyword search fused with vector search via reciprocal rank fusion.
+
+    Queries that are clearly lexical (identifiers such as clause numbers or
+    part codes, all found together in the top keyword hit) are answered from
+    BM25 alone, skipping the query-embedding round trip entirely.
+    """
+
+    def __init__(self, vector_retriever, keyword_index, k=4, candidates=HYBRID_CANDIDATES):
+        self.vector_retriever = vector_retriever
+        self.keyword_index = keyword_index
+        self.k = k
+        self.candidates = candidates
+
+    @property
+    def vectorstore(self):
+        return self.vector_retriever.vectorstore
+
+    def _keyword_docs(self, hits):
+        docs = []
+        for doc_id, _ in hits:
+            doc = self.vectorstore.docstore.search(doc_id)
+            # A plain string means "not found" in LangChain's docstore protocol.
+            if not isinstance(doc, str):
+                docs.append(doc)
+        return docs
+
+    def _is_lexical_hit(self, query, hits):
+        terms = tokenize(query)
+        identifiers = [token for token in terms if _IDENTIFIER_RE.fullmatch(token)]
+        if not (HYBRID_LEXICAL_SHORTCUT and identifiers and hits):
+            return False
+        if len(identifiers) < HYBRID_LEXICAL_MIN_SHARE * len(terms):
+            return False
+        return self.keyword_index.terms_for(hits[0][0], identifiers) == set(identifiers)
+
+    def invoke(self, query):
+        return self.search(query, self.k)
+
+    def search(self, query, k):
+        return self.search_many([query], k)[0]
+
+    def search_many(self, queries, k):
+        n = max(k, self.candidates)
+        hits = _map_concurrently(lambda query: self.keyword_index.search(query, n), queries)
+
+        results = [None] * len(queries)
+        vector_queries = []
+
+        for i, (query, query_hits) in enumerate(zip(queries, hits)):
+            if self._is_lexical_hit(query, query_hits):
+                print("🔤 Lexical query answered from keyword index")
+                results[i] = self._keyword_docs(query_hits[:k])
+            else:
+                vector_queries.append(i)
+
+        if vector_queries:
+            vector_docs = self.vector_retriever.search_many([queries[i] for i in vector_queries], n)
+            for i, docs in zip(vector_queries, vector_docs):
+                fused = reciprocal_rank_fusion([docs, self._keyword_docs(hits[i])])
+                results[i] = fused[:k]
+
+        return results
+
+
+# --------------------------------------------------
+# 🔀 MULTI-QUERY RETRIEVER
+# --------------------------------------------------
+
+class MultiQueryRetriever:
+    """
+    Searches the question plus LLM-rewritten variants and fuses the results.
+
+    The rewrite runs in the background while the original question is
+    retrieved, and is abandoned after `budget` seconds, so a slow LLM never
+    adds more than the budget to a question. Variants are searched together
+    (one batched embedding call, concurrent index lookups), deduplicated by
+    chunk id and fused with reciprocal rank fusion.
+    """
+
+    def __init__(self, base_retriever, rewrite, k=4, budget=MULTI_QUERY_REWRITE_BUDGET):
+        self.base_retriever = base_retriever
+        self.rewrite = rewrite
+        self.k = k
+        self.budget = budget
+
+    @property
+    def vectorstore(self):
+        return self.base_retriever.vectorstore
+
+    def invoke(self, query):
+        return self.search(query, self.k)
+
+    def search(self, query, k):
+        future = submit_rewrite(self.rewrite, query)
+        original = self.base_retriever.search(query, k)
+
+        seen = {query.strip().lower()}
+        variants = []
+        for variant in rewrite_result(future, self.budget):
+            if variant.lower() not in seen:
+                seen.add(variant.lower())
+                variants.append(variant)
+
+        if not variants:
+            return original
+
+        print(f"🔀 Multi-query: {len(variants)} variants")
+        rankings = [original, *self.base_retriever.search_many(variants, k)]
+
+        return reciprocal_rank_fusion(rankings)[:k]
+
+
+def build_retriever(vectorstore, keyword_index=None, k=4, rewrite=None, reranker=None):
+    """
+    Hybrid retriever when a keyword index is available, plain vector search
+    otherwise; wrapped in multi-query retrieval when a `rewrite` callable is
+    given, and in a wide-candidate rerank stage when a `reranker` is given.
+    """
+    retriever = VectorRetriever(vectorstore, k=k)
+
+    if keyword_index is not None:
+        retriever = HybridRetriever(retriever, keyword_index, k=k)
+
+    if rewrite is not None:
+        retriever = MultiQueryRetriever(retriever, rewrite, k=k)
+
+    if reranker is not None:
+        retriever = RerankingRetriever(retriever, reranker, k=k)
+
+    return retriever
@@ -1,12 +1,20 @@
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 
-def split_documents(documents):
 
-    splitter = RecursiveCharacterTextSplitter(
+def _get_splitter():
+
+    return RecursiveCharacterTextSplitter(
         chunk_size=800,
-        chunk_overlap=200
+        chunk_overlap=200,
+        # Character offsets let the context builder merge overlapping neighbours.
+        add_start_index=True,
     )
 
-    chunks = splitter.split_documents(documents)
 
-    return chunks
+def iter_split_documents(documents):
+    """Yield chunks document by document so callers never hold the full chunk list."""
+
+    splitter = _get_splitter()
+
+    for document in documents:
+        yield from splitter.split_documents([document])
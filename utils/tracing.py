@@ -0,0 +1,276 @@
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from bisect import bisect_left
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+# --------------------------------------------------
+# ⚙️ CONFIG
+# --------------------------------------------------
+
+# Emit one JSON log line per finished span.
+TRACE_LOG = os.getenv("TRACE_LOG", "false").lower() in ("1", "true", "yes")
+
+# Serve Prometheus text on this port (0 = off); Streamlit itself can't add routes.
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+
+# Recent samples kept per histogram for percentiles and dashboards.
+METRICS_WINDOW = int(os.getenv("METRICS_WINDOW", "1000"))
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+logger = logging.getLogger("rag.trace")
+
+
+# --------------------------------------------------
+# 📊 METRICS REGISTRY
+# --------------------------------------------------
+
+def _label_key(labels):
+    return tuple(sorted((k, str(v)) for k, v in labels.items() if v is not None))
+
+
+class _Histogram:
+    def __init__(self, window):
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.recent = deque(maxlen=window)
+
+    def observe(self, value):
+        self.buckets[bisect_left(LATENCY_BUCKETS, value)] += 1
+        self.count += 1
+        self.total += value
+        self.recent.append((time.time(), value))
+
+
+class MetricsRegistry:
+    """
+    Process-wide counters, gauges and latency histograms, keyed by metric
+    name plus labels. Histograms keep cumulative Prometheus buckets and a
+    window of recent samples for percentiles.
+    """
+
+    def __init__(self, window=METRICS_WINDOW):
+        self.window = window
+        self._counters = {}
+        self._gauges = {}
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def incr(self, name, value=1, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def set_gauge(self, name, value, **labels):
+        with self._lock:
+            self._gauges[(name, _label_key(labels))] = value
+
+    def observe(self, name, seconds, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = _Histogram(self.window)
+            histogram.observe(seconds)
+
+    def counter(self, name, **labels):
+        with self._lock:
+            return self._counters.get((name, _label_key(labels)), 0)
+
+    def counters(self, name):
+        """{labels dict as tuple: value} for every label set of a counter."""
+        with self._lock:
+            return {labels: value for (n, labels), value in self._counters.items() if n == name}
+
+    def gauge(self, name, **labels):
+        with self._lock:
+            return self._gauges.get((name, _label_key(labels)))
+
+    def samples(self, name, since=None):
+        """{labels: [recent values]} for a histogram, optionally only samples newer than `since`."""
+        with self._lock:
+            return {
+                labels: [value for ts, value in histogram.recent if since is None or ts >= since]
+                for (n, labels), histogram in self._histograms.items()
+                if n == name
+            }
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._gauges.clear()
+            self._histograms.clear()
+
+    def prometheus_text(self):
+        """Exposition in the Prometheus text format (version 0.0.4)."""
+        lines = []
+
+        def fmt(labels, extra=()):
+            pairs = [*labels, *extra]
+            if not pairs:
+                return ""
+            return "{" + ",".join(f'{k}="{v}"' for k, v in pairs) + "}"
+
+        with self._lock:
+            counters = sorted(self._counters.items())
+            gauges = sorted(self._gauges.items())
+            histograms = sorted(self._histograms.items(), key=lambda item: item[0])
+
+            for kind, items in (("counter", counters), ("gauge", gauges)):
+                seen = set()
+                for (name, labels), value in items:
+                    if name not in seen:
+                        seen.add(name)
+                        lines.append(f"# TYPE {name} {kind}")
+                    lines.append(f"{name}{fmt(labels)} {value}")
+
+            seen = set()
+            for (name, labels), histogram in histograms:
+                if name not in seen:
+                    seen.add(name)
+                    lines.append(f"# TYPE {name} histogram")
+                cumulative = 0
+                for bound, count in zip((*LATENCY_BUCKETS, "+Inf"), histogram.buckets):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{fmt(labels, [('le', bound)])} {cumulative}")
+                lines.append(f"{name}_sum{fmt(labels)} {histogram.total}")
+                lines.append(f"{name}_count{fmt(labels)} {histogram.count}")
+
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+# --------------------------------------------------
+# ⏱️ SPANS
+# --------------------------------------------------
+
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+
+class Span:
+    """A timed stage; attributes set on it end up in the structured log line."""
+
+    def __init__(self, name, parent=None, **attrs):
+        self.name = name
+        self.parent = parent
+        self.trace_id = parent.trace_id if parent else uuid.uuid4().hex[:16]
+        self.attrs = {k: v for k, v in attrs.items() if v is not None}
+        self.started = time.monotonic()
+        self.seconds = None
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def incr(self, key, value=1):
+        self.attrs[key] = self.attrs.get(key, 0) + value
+
+
+@contextmanager
+def span(name, **attrs):
+    """
+    Time a pipeline stage with a monotonic clock. Nested spans share the
+    parent's trace id. The duration goes into the `rag_stage_seconds`
+    histogram; errors are counted and re-raised.
+    """
+    current = Span(name, _current_span.get(), **attrs)
+    token = _current_span.set(current)
+    status = "ok"
+
+    try:
+        yield current
+    except BaseException:
+        status = "error"
+        raise
+    finally:
+        _current_span.reset(token)
+        current.seconds = time.monotonic() - current.started
+        metrics.observe("rag_stage_seconds", current.seconds, stage=name)
+        if status == "error":
+            metrics.incr("rag_stage_errors_total", stage=name)
+        _log_span(current, status)
+
+
+def current_span():
+    return _current_span.get()
+
+
+def _log_span(current, status):
+    if not TRACE_LOG:
+        return
+    logger.info(json.dumps({
+        "trace_id": current.trace_id,
+        "span": current.name,
+        "parent": current.parent.name if current.parent else None,
+        "status": status,
+        "ms": round(current.seconds * 1000, 2),
+        **current.attrs,
+    }, default=str))
+
+
+# --------------------------------------------------
+# 🌐 PROMETHEUS ENDPOINT
+# --------------------------------------------------
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = metrics.prometheus_text().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+_server = None
+_server_lock = threading.Lock()
+
+
+def start_metrics_server(port=METRICS_PORT):
+    """Serve /metrics on a daemon thread; idempotent, no-op when port is 0."""
+    global _server
+
+    if not port:
+        return None
+
+    with _server_lock:
+        if _server is None:
+            _server = ThreadingHTTPServer(("0.0.0.0", port), _MetricsHandler)
+            threading.Thread(target=_server.serve_forever, name="metrics", daemon=True).start()
+            print(f"📈 Metrics on http://0.0.0.0:{port}/metrics")
+
+    return _server
+
+
+if TRACE_LOG and not logger.handlers:
+    _handler = logging.StreamHandler()
+    _handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(_handler)
+    logger.setLevel(logging.INFO)